@@ -0,0 +1,89 @@
+# Copyright (c) 2009 NHN Inc. All rights reserved.
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#    * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#    * Neither the name of NHN Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+
+"""
+Measure the checking time of a file with line rules only.
+
+The same line rule is registered as a rule which needs the context, which
+was the only way before, as a rule which only needs the tokens, so that the
+context is not constructed, and as a raw line rule, so that the file is not
+lexed at all.
+Run it from the nsiqcppstyle folder.
+
+    python -m nsiqbenchmark.nsiqcppstyle_context_benchmark [lines]
+"""
+
+import sys
+import timeit
+import nsiqcppstyle_checker
+import nsiqcppstyle_rulemanager
+from nsiqbenchmark.nsiqcppstyle_memory_benchmark import BuildSource
+
+
+def RunLineRule(lexer, line, lineno):
+    """ A line rule which only looks at the line """
+    line.startswith(" ")
+
+
+def MeasureFile(data, needs, count):
+    """ Seconds to check the data once with the line rule """
+    ruleManager = nsiqcppstyle_rulemanager.ruleManager
+    ruleManager.ResetRegisteredRules()
+    if needs == nsiqcppstyle_rulemanager.NEEDS_LINES:
+        ruleManager.AddRawLineRule(RunLineRule)
+    else:
+        ruleManager.AddLineRule(RunLineRule, needs=needs)
+    try:
+        return timeit.timeit(lambda: nsiqcppstyle_checker.ProcessFile(ruleManager, "a.cpp", data),
+                             number=count) / count
+    finally:
+        ruleManager.ResetRegisteredRules()
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv
+    lines = 20000
+    if len(argv) > 1:
+        lines = int(argv[1])
+    data = BuildSource(lines)
+    # Build the lexer template up front so that it is not part of the measurement
+    nsiqcppstyle_checker._GetLexer()
+    before = MeasureFile(data, nsiqcppstyle_rulemanager.NEEDS_CONTEXT, 3)
+    after = MeasureFile(data, nsiqcppstyle_rulemanager.NEEDS_TOKENS, 3)
+    raw = MeasureFile(data, nsiqcppstyle_rulemanager.NEEDS_LINES, 3)
+    print("%d lines" % data.count("\n"))
+    print("%-30s %10.3f sec/file" % ("with the context", before))
+    print("%-30s %10.3f sec/file %6.1f x" % ("without the context", after, before / after))
+    print("%-30s %10.3f sec/file %6.1f x" % ("raw line rule", raw, before / raw))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+# Copyright (c) 2009 NHN Inc. All rights reserved.
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#    * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#    * Neither the name of NHN Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Measure the per-file lexer setup cost.
+
+Run it from the nsiqcppstyle folder.
+
+    python -m nsiqbenchmark.nsiqcppstyle_lexer_benchmark [count]
+"""
+
+import sys
+import timeit
+import nsiqcppstyle_lexer
+import nsiqcppstyle_checker
+
+SMALL_FILE = """
+#include <stdio.h>
+
+int main(int argc, char** argv) {
+    printf("Hello World");
+    return 0;
+}
+"""
+
+
+def BuildLexer():
+    """ Setup cost before the lexer template: reflect, validate and compile """
+    return nsiqcppstyle_lexer.lex(module=nsiqcppstyle_checker)
+
+
+def CloneLexer():
+    """ Setup cost with the lexer template: clone the prebuilt lexer """
+    return nsiqcppstyle_checker._GetLexer()
+
+
+def ProcessSmallFile():
+    nsiqcppstyle_checker.CppLexerNavigator("a.cpp", SMALL_FILE)
+
+
+def Report(title, seconds, count):
+    print("%-45s %10.1f usec/file" % (title, seconds * 1000000.0 / count))
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv
+    count = 200
+    if len(argv) > 1:
+        count = int(argv[1])
+    # Build the template up front so that it is not part of the measurement
+    CloneLexer()
+    Report("lexer setup (lex() per file)", timeit.timeit(BuildLexer, number=count), count)
+    Report("lexer setup (template clone per file)", timeit.timeit(CloneLexer, number=count), count)
+    Report("navigator on a small file", timeit.timeit(ProcessSmallFile, number=count), count)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+# Copyright (c) 2009 NHN Inc. All rights reserved.
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#    * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#    * Neither the name of NHN Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+
+"""
+Measure the memory held by the tokens of a large file.
+
+The tokens are built once with the __slots__ layout of LexToken and once
+with a plain object carrying a __dict__, which was the layout before.
+Run it from the nsiqcppstyle folder.
+
+    python -m nsiqbenchmark.nsiqcppstyle_memory_benchmark [lines]
+"""
+
+import sys
+import tracemalloc
+import nsiqcppstyle_lexer
+import nsiqcppstyle_checker
+
+BLOCK = """
+/**
+ * Doxygen comment of the function %(n)d
+ */
+#define VALUE_%(n)d (%(n)d * 2)
+class Sample%(n)d : public Base {
+public:
+    int Get%(n)d(int value) const;
+private:
+    int member_;
+};
+
+int Sample%(n)d::Get%(n)d(int value) const {
+    // return the sum
+    if (value > VALUE_%(n)d) {
+        return member_ + value;
+    }
+    return std::max<int>(member_, value);
+}
+"""
+
+
+class DictLexToken(object):
+    """ LexToken without __slots__ """
+
+    def __str__(self):
+        return nsiqcppstyle_lexer.LexToken.__str__(self)
+
+
+def BuildSource(lines):
+    blockLines = BLOCK.count("\n")
+    return "".join(BLOCK % {"n": n} for n in range(lines // blockLines + 1))
+
+
+def MeasureTokens(data, tokenClass):
+    """ Memory held by the navigator and the context information """
+    slotsTokenClass = nsiqcppstyle_lexer.LexToken
+    nsiqcppstyle_lexer.LexToken = tokenClass
+    try:
+        tracemalloc.start()
+        lexer = nsiqcppstyle_checker.CppLexerNavigator("a.cpp", data)
+        nsiqcppstyle_checker.ConstructContextInfo(lexer)
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    finally:
+        nsiqcppstyle_lexer.LexToken = slotsTokenClass
+    return current, len(lexer.tokenlist)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv
+    lines = 50000
+    if len(argv) > 1:
+        lines = int(argv[1])
+    data = BuildSource(lines)
+    # Build the lexer template up front so that it is not part of the measurement
+    nsiqcppstyle_checker._GetLexer()
+    before, count = MeasureTokens(data, DictLexToken)
+    after, count = MeasureTokens(data, nsiqcppstyle_lexer.LexToken)
+    print("%d lines, %d tokens" % (data.count("\n"), count))
+    print("%-30s %10.1f MB %8d bytes/token" % ("tokens with __dict__", before / 1048576.0, before // count))
+    print("%-30s %10.1f MB %8d bytes/token" % ("tokens with __slots__", after / 1048576.0, after // count))
+    print("%-30s %10.1f %%" % ("reduction", 100.0 * (before - after) / before))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+# Copyright (c) 2009 NHN Inc. All rights reserved.
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#    * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#    * Neither the name of NHN Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Measure writing a large violation set to the csv report and to the result
+store, and diffing two result stores.
+
+The second result set has some violations moved, fixed and added, like the
+result of the next week. Run it from the nsiqcppstyle folder.
+
+    python -m nsiqbenchmark.nsiqcppstyle_resultstore_benchmark [violations]
+"""
+
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import time
+import nsiqcppstyle_resultstore
+
+
+def BuildViolations(count, seed):
+    violations = []
+    for n in range(count):
+        fileNo = n // 100
+        ruleNo = n % 37
+        lineno = n % 100 * 7 + 1
+        if (n + seed) % 211 == 0:
+            # moved to the other line
+            lineno += 3
+        if (n + seed) % 997 == 0:
+            # fixed and added in the other result
+            ruleNo = 37 + seed
+        violations.append(("/src/module%d/file%d.cpp" % (fileNo // 50, fileNo), lineno, n % 80,
+                           "RULE_%d_%d_A" % (ruleNo // 10, ruleNo % 10),
+                           "Do not use the name%d here" % (n % 1000)))
+    return violations
+
+
+def WriteCsv(path, violations):
+    with open(path, "w", 1 << 20, newline="") as f:
+        writer = csv.writer(f)
+        for filename, lineno, column, ruleName, message in violations:
+            writer.writerow((filename, lineno, column, message, ruleName, ""))
+
+
+def WriteStore(path, violations):
+    writer = nsiqcppstyle_resultstore.ResultStoreWriter(path)
+    for eachViolation in violations:
+        writer.Add(*eachViolation)
+    writer.close()
+
+
+def Measure(name, function, *args):
+    start = time.time()
+    result = function(*args)
+    print("%-30s %10.2f s" % (name, time.time() - start))
+    return result
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv
+    count = 1000000
+    if len(argv) > 1:
+        count = int(argv[1])
+    oldViolations = BuildViolations(count, 0)
+    newViolations = BuildViolations(count, 1)
+    tempDir = tempfile.mkdtemp()
+    try:
+        csvPath = os.path.join(tempDir, "report.csv")
+        oldPath = os.path.join(tempDir, "old.nsr")
+        newPath = os.path.join(tempDir, "new.nsr")
+        print("%d violations" % count)
+        Measure("write csv", WriteCsv, csvPath, oldViolations)
+        Measure("write result store", WriteStore, oldPath, oldViolations)
+        WriteStore(newPath, newViolations)
+        print("%-30s %10.1f MB" % ("csv size", os.path.getsize(csvPath) / 1048576.0))
+        print("%-30s %10.1f MB" % ("result store size", os.path.getsize(oldPath) / 1048576.0))
+        Measure("read result store", lambda: sum(1 for v in nsiqcppstyle_resultstore.ResultStoreReader(oldPath).Violations()))
+        added, fixed = Measure("diff result stores", nsiqcppstyle_resultstore.DiffResultStores, oldPath, newPath)
+        print("%-30s %10d / %d" % ("new / fixed violations", len(added), len(fixed)))
+    finally:
+        shutil.rmtree(tempDir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
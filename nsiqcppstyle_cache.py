@@ -0,0 +1,114 @@
+# Copyright (c) 2022 All rights reserved.
+# SPDX-License-Identifier: GPL-2.0-only
+
+import os
+import json
+import hashlib
+import nsiqcppstyle_checker
+import nsiqcppstyle_lexer
+import nsiqcppstyle_reporter
+import nsiqcppstyle_rulehelper
+import nsiqcppstyle_rulemanager
+import nsiqcppstyle_state
+
+# Modules whose changes can change the violations of a file
+_engineModules = [nsiqcppstyle_checker, nsiqcppstyle_lexer, nsiqcppstyle_reporter,
+                  nsiqcppstyle_rulehelper, nsiqcppstyle_rulemanager]
+
+
+def GetConfigKey(ruleManager, ruleNames, varMap, version):
+    """
+    Get the digest of everything except the file itself which decides its violations.
+    It covers the tool version and engine, the active rules and their versions,
+    the rule variables and the file size limits.
+    """
+    digest = hashlib.md5()
+    digest.update(version.encode())
+    for eachModule in _engineModules:
+        with open(eachModule.__file__, "rb") as f:
+            digest.update(f.read())
+    for ruleName in ruleNames:
+        digest.update(("%s:%s\n" % (ruleName, ruleManager.GetRuleVersion(ruleName))).encode())
+    for key in sorted(varMap.keys()):
+        digest.update(("%s=%s\n" % (key, varMap[key])).encode())
+    state = nsiqcppstyle_state._nsiqcppstyle_state
+    digest.update(("%d,%d\n" % (state.streamSize, state.maxFileSize)).encode())
+    return digest.hexdigest()
+
+
+class ResultCache(object):
+    """
+     - Represent the on-disk cache of the violations of each file
+     - The entry of each file is keyed by the configuration key and
+       the path and content of the file.
+    """
+
+    def __init__(self, cacheDir, configKey):
+        self.cacheDir = cacheDir
+        self.configKey = configKey
+
+    def GetKey(self, filename):
+        digest = hashlib.md5(self.configKey.encode())
+        digest.update(os.path.abspath(filename).encode("utf-8", "surrogateescape"))
+        with open(filename, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _GetEntryPath(self, key):
+        return os.path.join(self.cacheDir, key[:2], key + ".json")
+
+    def Get(self, key, filename):
+        """
+        Get the cached (violations, suppressed rules) of the file or None
+        if there is no entry
+        """
+        try:
+            with open(self._GetEntryPath(key)) as f:
+                entry = json.load(f)
+            violations = [(filename, lineno, column, ruleName, message)
+                          for lineno, column, ruleName, message in entry["violations"]]
+            return violations, entry["suppressedRules"]
+        except (IOError, OSError, ValueError, TypeError, KeyError):
+            return None
+
+    def Put(self, key, violations, suppressedRules):
+        entryPath = self._GetEntryPath(key)
+        entry = {"violations": [(lineno, column, ruleName, message)
+                                for filename, lineno, column, ruleName, message in violations],  # @UnusedVariable
+                 "suppressedRules": suppressedRules}
+        tmpPath = "%s.%d.tmp" % (entryPath, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(entryPath), exist_ok=True)
+            with open(tmpPath, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmpPath, entryPath)
+        except (IOError, OSError):
+            pass
+
+
+def CheckFile(ruleManager, filename, cache=None):
+    """
+    Check the file and return its violations and the rules suppressed in
+    its first comment, which the rules run after it need.
+    On a cache hit, the cached violations are returned without lexing the file.
+    """
+    key = None
+    if cache is not None:
+        try:
+            key = cache.GetKey(filename)
+        except (IOError, OSError):
+            key = None
+        if key is not None:
+            checked = cache.Get(key, filename)
+            if checked is not None:
+                return checked
+    nsiqcppstyle_reporter.StartRecording()
+    try:
+        nsiqcppstyle_checker.ProcessFile(ruleManager, filename)
+    finally:
+        violations = nsiqcppstyle_reporter.StopRecording()
+    suppressedRules = nsiqcppstyle_state._nsiqcppstyle_state.GetSuppressedRules()
+    if key is not None:
+        cache.Put(key, violations, suppressedRules)
+    return violations, suppressedRules
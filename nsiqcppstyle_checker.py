@@ -27,7 +27,17 @@
 # ----------------------------------------------------------------------
 
 import os
+import re
+import sys
+import mmap
+import array
+import bisect
+import codecs
+import locale
+import hashlib
+import importlib.util
 import traceback
+import nsiqcppstyle_lexer
 from nsiqcppstyle_outputer import _consoleOutputer as console
 from nsiqcppstyle_rulehelper import *  # @UnusedWildImport
 # Reserved words
@@ -326,72 +336,540 @@ def t_error(t):
     t.lexer.skip(1)
 
 
+_lexerTemplate = None
+_lextabDir = None
+_lextabPrefix = "nsiqcppstyle_lextab_"
+
+
+def EnableLexTab(outputdir):
+    """
+    Keep the precompiled lexer table in the outputdir.
+    The first run writes the table and later runs load it instead of
+    reflecting and validating the token rules. None disables the table.
+    """
+    global _lexerTemplate
+    global _lextabDir
+    _lextabDir = outputdir
+    _lexerTemplate = None
+
+
+def _GetLexTabName():
+    """
+    Get the lexer table module name for the current token definitions.
+    The name contains the digest of the definitions, so that the table is
+    rebuilt whenever they change.
+    """
+    module = sys.modules[__name__]
+    digest = hashlib.md5()
+    digest.update(nsiqcppstyle_lexer.__tabversion__.encode())
+    digest.update(repr(tokens).encode())
+    funcRules = []
+    for name in sorted(each for each in dir(module) if each.startswith("t_")):
+        rule = getattr(module, name)
+        if hasattr(rule, "__call__"):
+            funcRules.append((rule.__code__.co_firstlineno, name))
+            rule = rule.__doc__
+        digest.update(repr((name, rule)).encode())
+    # Function rules are tried in the order of their definition
+    digest.update(repr([name for lineno, name in sorted(funcRules)]).encode())
+    return _lextabPrefix + digest.hexdigest()[:16]
+
+
+def _LoadLexTab(tabname):
+    tabpath = os.path.join(_lextabDir, tabname + ".py")
+    if not os.path.isfile(tabpath):
+        return None
+    try:
+        spec = importlib.util.spec_from_file_location(tabname, tabpath)
+        lextab = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(lextab)
+        return nsiqcppstyle_lexer.lex(module=sys.modules[__name__],
+                                      optimize=1, lextab=lextab)
+    except Exception as e:
+        console.Out.Verbose("Lexer table %s is not loaded : " % tabpath, e)
+        return None
+
+
+def _WriteLexTab(lexer, tabname):
+    tabpath = os.path.join(_lextabDir, tabname + ".py")
+    tmppath = os.path.join(_lextabDir, "%s_%d.tmp" % (tabname, os.getpid()))
+    try:
+        with open(tmppath, "w") as tf:
+            lexer._writetab_impl(tabname, tf)
+        os.replace(tmppath, tabpath)
+    except (IOError, OSError) as e:
+        console.Out.Verbose("Lexer table %s is not written : " % tabpath, e)
+        return
+    # Remove the tables built from former token definitions
+    for eachFile in os.listdir(_lextabDir):
+        if eachFile.startswith(_lextabPrefix) and not eachFile.startswith(tabname):
+            try:
+                os.remove(os.path.join(_lextabDir, eachFile))
+            except OSError:
+                pass
+
+
+def _BuildLexer():
+    if _lextabDir is None:
+        return nsiqcppstyle_lexer.lex(module=sys.modules[__name__])
+    tabname = _GetLexTabName()
+    lexer = _LoadLexTab(tabname)
+    if lexer is None:
+        lexer = nsiqcppstyle_lexer.lex(module=sys.modules[__name__])
+        _WriteLexTab(lexer, tabname)
+    return lexer
+
+
+def _GetLexer():
+    """
+    Get a new lexer for the token rules defined in this module.
+    The rules are reflected, validated and compiled into the master regexes
+    only once per process. Each caller gets a clone of that template.
+    """
+    global _lexerTemplate
+    if _lexerTemplate is None:
+        _lexerTemplate = _BuildLexer()
+    return _lexerTemplate.clone()
+
+
+# The encodings of the byte order marks, longer marks first
+_BOMS = ((codecs.BOM_UTF32_LE, "utf-32"), (codecs.BOM_UTF32_BE, "utf-32"),
+         (codecs.BOM_UTF8, "utf-8-sig"),
+         (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16"))
+
+
+def GetSourceEncodings(head):
+    """
+    Get the encodings to try in order for the source file starting with the
+    given bytes. The byte order mark or the zero bytes of UTF-16 text decide
+    the first one. UTF-8 and the encoding of the platform are tried next.
+    Latin-1, which decodes anything, is the last one.
+    """
+    encodings = []
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            encodings.append(encoding)
+            break
+    else:
+        # UTF-16 source without BOM has the zero high bytes of the ASCII
+        # characters at every other position, not only a stray zero byte
+        evenZeros = head[0::2].count(0)
+        oddZeros = head[1::2].count(0)
+        if oddZeros * 4 > len(head) and evenZeros * 8 <= oddZeros:
+            encodings.append("utf-16-le")
+        elif evenZeros * 4 > len(head) and oddZeros * 8 <= evenZeros:
+            encodings.append("utf-16-be")
+    encodings.extend(["utf-8", locale.getpreferredencoding(False), "latin-1"])
+    names = []
+    for encoding in encodings:
+        if codecs.lookup(encoding).name not in [codecs.lookup(name).name for name in names]:
+            names.append(encoding)
+    return names
+
+
+def ReadSource(filename):
+    """
+    Read the source file through a memory map and decode it in the first of
+    GetSourceEncodings which fits. The line breaks are translated to \\n as
+    when the file is read in the text mode.
+    """
+    with open(filename, "rb") as f:
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # An empty file or a file which can't be mapped
+            buffer = f.read()
+        try:
+            for encoding in GetSourceEncodings(buffer[:4096]):
+                try:
+                    data = str(buffer, encoding)
+                    break
+                except UnicodeDecodeError:
+                    console.Out.Verbose("%s is not in %s" % (filename, encoding))
+        finally:
+            if isinstance(buffer, mmap.mmap):
+                buffer.close()
+    if "\r" in data:
+        data = data.replace("\r\n", "\n").replace("\r", "\n")
+    return data
+
+
+def _IsFirstCommentRead(data):
+    """
+    Whether the first comment of the data, which ends at a line end, is the
+    one of the whole source, so nothing after the end of the data can change
+    it, like the end of a comment started by "/*" before it.
+    """
+    if "/*" not in data:
+        return True
+    comment = FindFirstComment(data)
+    return comment is not None and comment.lexpos + len(comment.value) < len(data) \
+        and "/*" not in data[:comment.lexpos]
+
+
+def ReadFirstComment(filename, chunkSize=4096):
+    """
+    Read the source file until the end of its first comment, or the whole
+    file if it has no comment. The file is read in the growing chunks, and
+    the first comment found is taken when nothing after the end of what is
+    read can change it, like the end of a comment started by "/*" before it.
+    """
+    with open(filename, "rb") as f:
+        encodings = GetSourceEncodings(f.read(4096))
+        for encoding in encodings:
+            f.seek(0)
+            decoder = codecs.getincrementaldecoder(encoding)()
+            chunks = []
+            size = chunkSize
+            try:
+                while True:
+                    chunk = f.read(size)
+                    chunks.append(decoder.decode(chunk, not chunk))
+                    data = "".join(chunks)
+                    if "\r" in data:
+                        data = data.replace("\r\n", "\n").replace("\r", "\n")
+                    if not chunk:
+                        return data
+                    if "//" in data or "/*" in data:
+                        comment = FindFirstComment(data)
+                        if comment is not None and comment.lexpos + len(comment.value) < len(data) \
+                                and "/*" not in data[:comment.lexpos]:
+                            return data
+                    size *= 2
+            except UnicodeDecodeError:
+                console.Out.Verbose("%s is not in %s" % (filename, encoding))
+
+
+def OpenSource(filename):
+    """
+    Open the source file to be read in the text mode in the first of
+    GetSourceEncodings which fits. The file is decoded chunk by chunk to find it.
+    """
+    with open(filename, "rb") as f:
+        encodings = GetSourceEncodings(f.read(4096))
+        for encoding in encodings[:-1]:
+            f.seek(0)
+            decoder = codecs.getincrementaldecoder(encoding)()
+            try:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    decoder.decode(chunk)
+                decoder.decode(b"", True)
+                break
+            except UnicodeDecodeError:
+                console.Out.Verbose("%s is not in %s" % (filename, encoding))
+        else:
+            encoding = encodings[-1]
+    return open(filename, encoding=encoding)
+
+
+# The comment which suppresses the violations on its line, "// NS" for all
+# the rules or e.g. "// NS: RULE_4_1_A, RULE_4_4_A" for the given rules
+_SUPPRESSION = re.compile(r"//[^\S\n]*NS(?:[^\S\n]*:?[^\S\n]*(RULE_\w+(?:[^\S\n]*,?[^\S\n]*RULE_\w+)*))?")
+
+
+def GetLineSuppression(line):
+    """
+    Get the rules suppressed on the line, an empty tuple for all the rules.
+    None if nothing is suppressed.
+    """
+    suppression = None
+    for match in _SUPPRESSION.finditer(line):
+        suppression = _AddSuppression(suppression, match)
+    return suppression
+
+
+def _AddSuppression(suppression, match):
+    if match.group(1) is None or suppression == ():
+        return ()
+    return (suppression or ()) + tuple(match.group(1).replace(",", " ").split())
+
+
+def IsRuleSuppressed(suppression, ruleName):
+    """
+    Check if the rule is in the suppression given by GetLineSuppression.
+    A rule name can be given by its prefix, e.g. RULE_4_1_A.
+    """
+    if suppression is None:
+        return False
+    return not suppression or any(ruleName == eachRule or ruleName.startswith(eachRule + "_")
+                                  for eachRule in suppression)
+
+
+class _Lines:
+    """
+    The lines of the data without the line breaks. A line is sliced from the
+    data when it's used, so that the lines are not kept as another copy.
+    """
+
+    def __init__(self, data, lineStarts):
+        self.data = data
+        self.lineStarts = lineStarts
+
+    def __len__(self):
+        return len(self.lineStarts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[each] for each in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self.lineStarts)
+        start = self.lineStarts[index]
+        if index + 1 < len(self.lineStarts):
+            return self.data[start:self.lineStarts[index + 1] - 1]
+        return self.data[start:]
+
+    def __iter__(self):
+        for index in range(len(self.lineStarts)):
+            yield self[index]
+
+
+class _SkipTable:
+    """
+    Sorted indices of the tokens which are not skipped in a navigation mode.
+    rank[i + 1] is the number of these tokens up to the token index i,
+    so that moving k tokens from any token is index arithmetic.
+    """
+
+    def __init__(self, indices, tokenlistsize):
+        self.indices = indices
+        self.rank = rank = [0] * (tokenlistsize + 1)
+        count = 0
+        pos = 0
+        for index in indices:
+            while pos <= index:
+                rank[pos] = count
+                pos += 1
+            count += 1
+        while pos <= tokenlistsize:
+            rank[pos] = count
+            pos += 1
+
+    def Next(self, tokenindex, offset):
+        """ Index of the offset-th token after the token index, or -1 """
+        pos = self.rank[tokenindex + 1] + offset - 1
+        if pos < len(self.indices):
+            return self.indices[pos]
+        return -1
+
+    def Prev(self, tokenindex, offset):
+        """ Index of the offset-th token before the token index, or -1 """
+        if tokenindex < 0:
+            return -1
+        pos = self.rank[tokenindex] - offset
+        if pos >= 0:
+            return self.indices[pos]
+        return -1
+
+
 class CppLexerNavigator(object):
     """
     Main class for Cpp Lexer
     """
 
-    def __init__(self, filename, data=None):
+    def __init__(self, filename, data=None, lineOffset=0, ifdefFrames=None, tokenize=True):
+        """
+        Lex the file or the given data. When the data is a window of a file,
+        lineOffset is the number of the lines before it and ifdefFrames is the
+        state of the #if blocks open at its start, see GetIfdefFrames.
+        If tokenize is False, only the lines are given and there are no tokens.
+        """
         self.filename = filename
+        self.tokenized = tokenize
+        self.lineOffset = lineOffset
+        self.ifdefFrames = [list(frame) for frame in ifdefFrames or []]
         self.tokenlist = []
         self.indexstack = []
         self.tokenindex = -1
-        self.matchingPair = {}
-        self.reverseMatchingPair = {}
-        self.ifdefstack = []
-        import nsiqcppstyle_lexer
-        lexer = nsiqcppstyle_lexer.lex()
+        self.inactiveRanges = []
+        self.skipTables = {}
+        self.directiveLines = None
+        lexer = _GetLexer()
         self.data = data
         if data is None:
-            with open(filename) as f:
-                try:
-                    self.data = f.read()
-                except UnicodeDecodeError as ex:
-                    console.Out.Ci("[ERROR] UnicodeDecodeError in CppLexerNavigator: " + str(ex))
-                    console.Out.Ci("[ERROR] Exception occurred reading file '%s', convert from UTF16LE to UTF8" % (filename))
-                    raise ex
-        self.lines = self.data.splitlines()
-        lexer.input(self.data)
+            self.data = ReadSource(filename)
+        self.lineStarts = array.array("q", [0])
+        start = self.data.find("\n")
+        while start != -1:
+            self.lineStarts.append(start + 1)
+            start = self.data.find("\n", start + 1)
+        self.lines = _Lines(self.data, self.lineStarts)
+        self.suppressedLines = {}
+        for match in _SUPPRESSION.finditer(self.data):
+            lineno = bisect.bisect_right(self.lineStarts, match.start()) + lineOffset
+            self.suppressedLines[lineno] = _AddSuppression(self.suppressedLines.get(lineno), match)
+        self.lineLayouts = [None] * len(self.lines)
+        self.tokenLines = None
+        lexer.input(self.data if tokenize else "")
+        lexer.lineno = lineOffset + 1
         index = 0
         while True:
             tok = lexer.token()
             if not tok:
                 break
             tok.column = self._GetColumn(tok)
+            tok.navigator = self
             tok.index = index
             tok.inactive = False
             index += 1
             self.tokenlist.append(tok)
-            tok.line = self.lines[tok.lineno - 1]
             tok.filename = self.filename
             tok.pp = None
-#                self.ProcessIfdef(tok)
+            tok.contextStack = None
+            tok.context = None
         self.tokenlistsize = len(self.tokenlist)
-        self.PushTokenIndex()
-        while(True):
-            t = self.GetNextToken()
-            if t is None:
-                break
-            t.inactive = self.ProcessIfdef(t)
-        self.PopTokenIndex()
+        self._MarkInactive()
+        self._MarkPreprocess()
+        self._BuildMatchingTable()
+        self.nextTokenTable = {"LBRACE": self._BuildNextTokenTable("LBRACE"),
+                               "SEMI": self._BuildNextTokenTable("SEMI")}
 
-    def ProcessIfdef(self, token):
-        if token.type == "PREPROCESSOR":
-            if Match(r"^#\s*if(n)?def$", token.value):
-                self.ifdefstack.append(True)
-            elif Match(r"^#\s*if$", token.value):
-                nextToken = self.PeekNextTokenSkipWhiteSpaceAndComment()
-                if nextToken is not None and nextToken.value == "0":
-                    self.ifdefstack.append(False)
+    def _MarkPreprocess(self):
+        """
+        Mark the tokens in the preprocessor lines, including the lines
+        continued by a backslash.
+        """
+        ppScope = False
+        prevToken = None
+        for token in self.tokenlist:
+            if token.inactive or token.type in (
+                    "SPACE", "LINEFEED", "COMMENT", "CPPCOMMENT"):
+                continue
+            if token.type == "PREPROCESSOR":
+                token.pp = True
+                ppScope = True
+            elif ppScope:
+                if prevToken.lineno == token.lineno - 1:
+                    ppScope = (prevToken.type == "PREPROCESSORNEXT")
+                    token.pp = ppScope
+                elif prevToken.lineno == token.lineno:
+                    token.pp = True
                 else:
-                    self.ifdefstack.append(True)
-            elif Match(r"^#\s*endif$", token.value):
-                if len(self.ifdefstack) != 0:
-                    self.ifdefstack.pop()
-        for ifdef in self.ifdefstack:
-            if not ifdef:
-                return True
-        return False
+                    ppScope = False
+            prevToken = token
+
+    def _BuildNextTokenTable(self, type):
+        """
+        Build the table of the index of the next active non preprocessor
+        token in the given type. The entry of the token index i is at i + 1,
+        so that the table can also be used before the first token.
+        -1 means there is no such token.
+        """
+        table = [-1] * (self.tokenlistsize + 1)
+        nextIndex = -1
+        for index in range(self.tokenlistsize - 1, -1, -1):
+            table[index + 1] = nextIndex
+            token = self.tokenlist[index]
+            if token.type == type and not token.inactive and not token.pp:
+                nextIndex = index
+        table[0] = nextIndex
+        return table
+
+    def _MarkInactive(self):
+        """
+        Mark the tokens in the branches of #if blocks which are never taken.
+        Only the constant conditions 0 and 1 are known, the branches of the
+        other conditions are all active.
+        Each directive takes the state after it, so #if 0 is inactive and its
+        #else and #endif are active. The inactive spans are kept in
+        inactiveRanges as (first, last) token indices.
+        """
+        frames = [list(frame) for frame in self.ifdefFrames]
+        falseDepth = sum(frame[0] for frame in frames)
+        start = -1
+        for token in self.tokenlist:
+            if token.type == "PREPROCESSOR":
+                falseDepth += self._ApplyDirective(frames, token)
+            token.inactive = falseDepth > 0
+            if token.inactive and start == -1:
+                start = token.index
+            elif not token.inactive and start != -1:
+                self.inactiveRanges.append((start, token.index - 1))
+                start = -1
+        if start != -1:
+            self.inactiveRanges.append((start, self.tokenlistsize - 1))
+
+    def _ApplyDirective(self, frames, token):
+        """
+        Update the [inactive, taken] frames of the open #if blocks by the
+        directive and return the change of the number of inactive frames.
+        """
+        directive = token.value[1:].strip()
+        if directive in ("if", "ifdef", "ifndef"):
+            condition = None
+            if directive == "if":
+                condition = self._GetDirectiveCondition(token)
+            frames.append([condition is False, condition is True])
+            return int(condition is False)
+        if directive in ("elif", "elifdef", "elifndef", "else") and frames:
+            frame = frames[-1]
+            if frame[1]:
+                inactive = True
+            elif directive == "elif":
+                condition = self._GetDirectiveCondition(token)
+                inactive = condition is False
+                frame[1] = condition is True
+            else:
+                inactive = False
+            change = inactive - frame[0]
+            frame[0] = inactive
+            return change
+        if directive == "endif" and frames:
+            return -frames.pop()[0]
+        return 0
+
+    def GetIfdefFrames(self, tokenindex):
+        """
+        Get the state of the #if blocks open before the token, which can be
+        given to the lexer of the next window.
+        """
+        frames = [list(frame) for frame in self.ifdefFrames]
+        for token in self.tokenlist[:tokenindex]:
+            if token.type == "PREPROCESSOR":
+                self._ApplyDirective(frames, token)
+        return frames
+
+    def GetWindowBreaks(self):
+        """
+        Get the indices of the tokens where the data can be split into windows
+        which are lexed separately. They start a line which is not in a comment,
+        a string or a preprocessor statement continued by a backslash.
+        There are no breaks after a comment or a string which is not closed,
+        as it may be closed after the end of the data.
+        """
+        breaks = []
+        prevType = None
+        lineEnd = False
+        end = 0
+        for token in self.tokenlist:
+            if token.lexpos > end and '"' in self.data[end:token.lexpos]:
+                break
+            if token.type == "TIMES" and prevType == "DIVIDE" and token.lexpos == end:
+                break
+            if lineEnd:
+                breaks.append(token.index)
+            lineEnd = token.type == "LINEFEED" and prevType != "PREPROCESSORNEXT"
+            if token.type != "SPACE":
+                prevType = token.type
+            end = token.lexpos + len(token.value)
+        return breaks
+
+    def _GetDirectiveCondition(self, token):
+        """
+        Get the condition of #if or #elif if it is a constant.
+        It's False for 0, True for a lone 1 and None otherwise.
+        """
+        values = []
+        for index in range(token.index + 1, self.tokenlistsize):
+            nextToken = self.tokenlist[index]
+            if nextToken.lineno != token.lineno:
+                break
+            if nextToken.type not in ("SPACE", "LINEFEED", "COMMENT", "CPPCOMMENT"):
+                values.append(nextToken.value)
+        if values[:1] == ["0"]:
+            return False
+        if values == ["1"]:
+            return True
+        return None
 
     def Backup(self):
         """
@@ -407,6 +885,27 @@ class CppLexerNavigator(object):
         self.tokenindex = data[0]
         self.indexstack = data[1]
 
+    def Checkpoint(self):
+        """
+        Get the current context in lexer to be restored by RestoreCheckpoint.
+        Unlike Backup, it keeps the index stack in a tuple, which is the empty
+        one when the rules are run.
+        """
+        return (self.tokenindex, tuple(self.indexstack))
+
+    def RestoreCheckpoint(self, checkpoint):
+        """
+        Restore the lexer context of the checkpoint.
+        Return False if the index stack was not the one of the checkpoint,
+        because of a push without pop or a pop without push.
+        """
+        self.tokenindex, indexstack = checkpoint
+        if len(self.indexstack) == len(indexstack) and \
+                (not indexstack or tuple(self.indexstack) == indexstack):
+            return True
+        self.indexstack[:] = indexstack
+        return False
+
     def Reset(self):
         """
         Reset Lexer
@@ -420,9 +919,35 @@ class CppLexerNavigator(object):
         """
         curToken = self.GetCurToken()
         if curToken is not None:
-            return self.lines[curToken.lineno - 1]
+            return self.GetLine(curToken.lineno)
         return None
 
+    def IsTokenLine(self, lineno):
+        """
+        Tell whether a token, which is not a white space nor in an inactive
+        #if block, starts in the line. The line rules run on these lines.
+        """
+        if self.tokenLines is None:
+            context = self._SkipContext(True, False)
+            self.tokenLines = set(token.lineno for token in self.tokenlist
+                                  if not token.inactive and token.type not in context)
+        return lineno in self.tokenLines
+
+    def GetLine(self, lineno):
+        """
+        Get the line of the line number without the line break
+        """
+        return self.lines[lineno - self.lineOffset - 1]
+
+    def IsSuppressed(self, lineno, ruleName):
+        """
+        Check if the violations of the rule on the line are suppressed,
+        by a // NS comment on the line or in the first comment of the file.
+        """
+        return (lineno in self.suppressedLines and
+                IsRuleSuppressed(self.suppressedLines[lineno], ruleName)) or \
+            nsiqcppstyle_state._nsiqcppstyle_state.CheckRuleSuppression(ruleName)
+
     def _MoveToToken(self, token):
         self.tokenindex = token.index
 
@@ -430,13 +955,41 @@ class CppLexerNavigator(object):
         """
         Get given token column
         """
-        last_cr = self.data.rfind('\n', 0, token.lexpos)
-        if last_cr < 0:
-            last_cr = -1
-        column = (token.lexpos - last_cr)
-        if column == 0:
-            return 1
-        return column
+        lineStart = self.lineStarts[bisect.bisect_right(self.lineStarts, token.lexpos) - 1]
+        return token.lexpos - lineStart + 1
+
+    def _GetLineLayout(self, lineno):
+        """
+        Get the length, the tab positions and the spaces and tabs of the
+        indentation of the line. They are computed once per line.
+        """
+        lineno -= self.lineOffset
+        layout = self.lineLayouts[lineno - 1]
+        if layout is None:
+            line = self.lines[lineno - 1]
+            tabs = []
+            tab = line.find("\t")
+            while tab != -1:
+                tabs.append(tab)
+                tab = line.find("\t", tab + 1)
+            indent = line[:len(line) - len(line.lstrip(" \t"))]
+            layout = (len(line), tabs, indent.count(" "), indent.count("\t"))
+            self.lineLayouts[lineno - 1] = layout
+        return layout
+
+    def GetRealColumn(self, token, tabsize=4):
+        """
+        Get the token column where the tabs before it are expanded to tabsize
+        """
+        length, tabs, indentSpaces, indentTabs = self._GetLineLayout(token.lineno)  # @UnusedVariable
+        return min(token.column, length) + bisect.bisect_left(tabs, token.column) * (tabsize - 1)
+
+    def GetIndentation(self, token, tabsize=4):
+        """
+        Get the indentation of the line of the token where the tabs are expanded to tabsize
+        """
+        length, tabs, indentSpaces, indentTabs = self._GetLineLayout(token.lineno)  # @UnusedVariable
+        return indentSpaces + indentTabs * tabsize
 
     def GetCurToken(self):
         """
@@ -473,12 +1026,8 @@ class CppLexerNavigator(object):
         Get Next Token skip whitespace, comment and preprocess.
         This method doesn't change the current lex position.
         """
-        self.PushTokenIndex()
-        token = None
-        for x in range(offset):  # @UnusedVariable
-            token = self.GetNextTokenSkipWhiteSpaceAndCommentAndPreprocess()
-        self.PopTokenIndex()
-        return token
+        index = self._GetSkipTable(True, True, True, True).Next(self.tokenindex, offset)
+        return self.tokenlist[index] if index != -1 else None
 
     def PeekNextTokenSkipWhiteSpaceAndComment(self):
         """
@@ -501,12 +1050,8 @@ class CppLexerNavigator(object):
         Get Previous Token skip whitespace and comment.
         This method doesn't change the current lex position.
         """
-        self.PushTokenIndex()
-        token = None
-        for x in range(offset):  # @UnusedVariable
-            token = self.GetPrevTokenSkipWhiteSpaceAndCommentAndPreprocess()
-        self.PopTokenIndex()
-        return token
+        index = self._GetSkipTable(False, True, True, True).Prev(self.tokenindex, offset)
+        return self.tokenlist[index] if index != -1 else None
 
     def PeekPrevTokenSkipWhiteSpaceAndComment(self):
         """
@@ -558,6 +1103,14 @@ class CppLexerNavigator(object):
         - skipDirective - skip preprocessor line
         - skipMatchingBraces - skip all { [ ( and matching pair
         """
+        if not skipMatchingBraces:
+            table = self._GetSkipTable(True, skipWhiteSpace, skipComment, skipDirective)
+            index = table.Next(self.tokenindex, 1)
+            if index == -1:
+                self.tokenindex = self.tokenlistsize - 1
+                return None
+            self.tokenindex = index
+            return self.tokenlist[index]
         context = self._SkipContext(skipWhiteSpace, skipComment)
         while(True):
             token = self._GetNextToken()
@@ -573,95 +1126,33 @@ class CppLexerNavigator(object):
                 if token.pp == True:
                     continue
             if token.type not in context:
-                if token is not None:
-                    token.column = self._GetColumn(token)
                 return token
 
     def GetNextMatchingGT(self, keepCur=False):
         if keepCur:
             self.PushTokenIndex()
-        gtStack = []
         if self.GetCurToken().type != "LT":
             raise RuntimeError(
                 'Matching next GT token should be examined when cur token is <')
-        gtStack.append(self.GetCurToken())
-        t = self._GetNextMatchingGTToken(gtStack)
+        t = self._GetMatchingToken()
         if keepCur:
             self.PopTokenIndex()
         return t
 
-    def _GetNextMatchingGTToken(self, tokenStack):
-        while True:
-            nextToken = self._GetNextToken()
-            if nextToken is None:
-                return None
-            elif nextToken.type in ["LT"]:
-                tokenStack.append(nextToken)
-
-            elif nextToken.type in ["GT"]:
-                tokenStack.pop()
-                if len(tokenStack) == 0:
-                    return nextToken
-            elif nextToken.type in ["RSHIFT"]:
-                tokenStack.pop()
-                if len(tokenStack) == 0:
-                    return nextToken
-                tokenStack.pop()
-                if len(tokenStack) == 0:
-                    return nextToken
-
     def GetNextMatchingToken(self, keepCur=False):
         """
         Get matching token
         """
         if keepCur:
             self.PushTokenIndex()
-        tokenStack = []
         if self.GetCurToken().type not in ["LPAREN", "LBRACE", "LBRACKET"]:
             raise RuntimeError(
                 'Matching token should be examined when cur token is { [ (')
-        tokenStack.append(self.GetCurToken())
-        t = self._GetNextMatchingToken(tokenStack)
+        t = self._GetMatchingToken()
         if keepCur:
             self.PopTokenIndex()
         return t
 
-    def _GetNextMatchingToken(self, tokenStack):
-        searchToken = tokenStack[-1]
-        matchingToken = self.matchingPair.get(searchToken, None)
-        lastPopedToken = None
-        if matchingToken is not None:
-            self._MoveToToken(matchingToken)
-            return matchingToken
-        while True:
-            nextToken = self._GetNextToken()
-            if nextToken is None:
-                if lastPopedToken in self.reverseMatchingPair:
-                    return None
-                self.matchingPair[searchToken] = lastPopedToken
-                self.reverseMatchingPair[lastPopedToken] = searchToken
-                return lastPopedToken
-            if nextToken.type in ["LPAREN", "LBRACE", "LBRACKET"]:
-                tokenStack.append(nextToken)
-                # print "Push", nextToken
-
-            if nextToken.type in ["RPAREN", "RBRACE", "RBRACKET"]:
-                prevTokenPair = tokenStack[-1]
-                if prevTokenPair is not None:
-                    if prevTokenPair.type[1:] == nextToken.type[1:]:
-                        tokenStack.pop()
-                        lastPopedToken = nextToken
-                        if len(tokenStack) == 0:
-                            if nextToken in self.reverseMatchingPair:
-                                return None
-                            self.matchingPair[searchToken] = nextToken
-                            self.reverseMatchingPair[nextToken] = searchToken
-                            return nextToken
-                    else:
-                        return None
-                else:
-                    return None
-
     def GetPrevTokenSkipWhiteSpace(self):
         return self.GetPrevToken(True)
 
@@ -671,6 +1162,14 @@ class CppLexerNavigator(object):
     def GetPrevToken(self, skipWhiteSpace=False,
                      skipComment=False, skipDirective=False,
                      skipMatchingBraces=False):
+        if not skipMatchingBraces:
+            table = self._GetSkipTable(False, skipWhiteSpace, skipComment, skipDirective)
+            index = table.Prev(self.tokenindex, 1)
+            if index == -1:
+                self.tokenindex = -1
+                return None
+            self.tokenindex = index
+            return self.tokenlist[index]
         context = self._SkipContext(skipWhiteSpace, skipComment)
         while(True):
             token = self._GetPrevToken()
@@ -694,77 +1193,156 @@ class CppLexerNavigator(object):
     def GetPrevMatchingLT(self, keepCur=False):
         if keepCur:
             self.PushTokenIndex()
-        gtStack = []
         if not self.GetCurToken().type in ["GT", "RSHIFT"]:
             raise RuntimeError(
                 'Matching previous LT token should be examined when cur token is > or >>')
-        # If >> token is found, append it twice
-        if self.GetCurToken().type == "RSHIFT":
-            gtStack.append(self.GetCurToken())
-        gtStack.append(self.GetCurToken())
-        t = self._GetPrevMatchingLTToken(gtStack)
+        t = self._GetMatchingToken()
         if keepCur:
             self.PopTokenIndex()
         return t
 
-    def _GetPrevMatchingLTToken(self, tokenStack):
-        while True:
-            prevToken = self._GetPrevToken()
-            if prevToken is None:
-                return None
-            elif prevToken.type in ["GT"]:
-                tokenStack.append(prevToken)
-            elif prevToken.type in ["RSHIFT"]:
-                tokenStack.append(prevToken)
-                tokenStack.append(prevToken)
-            elif prevToken.type in ["LT"]:
-                tokenStack.pop()
-                if len(tokenStack) == 0:
-                    return prevToken
-
     def GetPrevMatchingToken(self, keepCur=False):
         if keepCur:
             self.PushTokenIndex()
-        tokenStack = []
         if self.GetCurToken().type not in ["RPAREN", "RBRACE", "RBRACKET"]:
             raise RuntimeError(
                 'Matching token should be examined when cur token is } ) ]')
-        tokenStack.append(self.GetCurToken())
-
-        t = self._GetPrevMatchingToken(tokenStack)
+        t = self._GetMatchingToken()
         if keepCur:
             self.PopTokenIndex()
         return t
 
-    def _GetPrevMatchingToken(self, tokenStack):
-        searchToken = tokenStack[-1]
-        matchingToken = self.reverseMatchingPair.get(searchToken, None)
-        if matchingToken is not None:
-            self._MoveToToken(matchingToken)
-            return matchingToken
-        while True:
-            prevToken = self._GetPrevToken()
-            if prevToken is None:
-                return None
-            if prevToken.type in ["RPAREN", "RBRACE", "RBRACKET"]:
-                tokenStack.append(prevToken)
-                # print "Push", nextToken
-
-            elif prevToken.type in ["LPAREN", "LBRACE", "LBRACKET"]:
-                prevTokenPair = tokenStack[-1]
-                if prevTokenPair is not None:
-                    if prevTokenPair.type[1:] == prevToken.type[1:]:
-                        tokenStack.pop()
-                        # print "Pop", nextToken
-                        # print tokenStack
-                        if len(tokenStack) == 0:
-                            self.reverseMatchingPair[searchToken] = prevToken
-                            self.matchingPair[prevToken] = searchToken
-                            return prevToken
-                    else:
-                        return None
+    def _GetMatchingToken(self):
+        """
+        Look up the matching token of the current token and move to it.
+        If there is no matching token, move to the token where the search stopped.
+        """
+        index = self.tokenindex
+        matchingIndex = self.matchingTable[index]
+        self.tokenindex = self.matchingStop.get(index, matchingIndex)
+        if matchingIndex == -1:
+            return None
+        return self.tokenlist[matchingIndex]
+
+    def _BuildMatchingTable(self):
+        """
+        Build the table of the matching tokens of ( [ { and < > in one pass.
+        An opening token has the index of its closing token, and a closing
+        token has the index of its opening token. -1 means there is no match.
+
+        matchingStop keeps where the cursor stops for the unbalanced tokens.
+        A mismatched closing token stops all the pending opening tokens.
+        The outermost opening token left at the end of the file takes the last
+        closed token, which is then no longer matched by its own opening token.
+        """
+        tokenlist = self.tokenlist
+        last = self.tokenlistsize - 1
+        table = [-1] * self.tokenlistsize
+        stop = {}
+        self.matchingTable = table
+        self.matchingStop = stop
+
+        stack = []
+        lastClosed = -1
+        for index, token in enumerate(tokenlist):
+            if token.type in ("LPAREN", "LBRACE", "LBRACKET"):
+                stack.append(index)
+            elif token.type in ("RPAREN", "RBRACE", "RBRACKET") and stack:
+                if tokenlist[stack[-1]].type[1:] == token.type[1:]:
+                    opening = stack.pop()
+                    table[opening] = index
+                    table[index] = opening
+                    lastClosed = index
                 else:
-                    return None
+                    for opening in stack:
+                        stop[opening] = index
+                    stack = []
+        for opening in stack:
+            stop[opening] = last
+        if stack and stack[0] < lastClosed:
+            stolen = table[lastClosed]
+            table[stolen] = -1
+            stop[stolen] = lastClosed
+            table[stack[0]] = lastClosed
+            table[lastClosed] = stack[0]
+
+        # The closing tokens without matching opening one are searched backward
+        stack = []
+        for index in range(last, -1, -1):
+            token = tokenlist[index]
+            if token.type in ("RPAREN", "RBRACE", "RBRACKET"):
+                stack.append(index)
+            elif token.type in ("LPAREN", "LBRACE", "LBRACKET") and stack:
+                if tokenlist[stack[-1]].type[1:] == token.type[1:]:
+                    closing = stack.pop()
+                    if table[closing] == -1:
+                        table[closing] = index
+                else:
+                    for closing in stack:
+                        if table[closing] == -1:
+                            stop[closing] = index
+                    stack = []
+        for closing in stack:
+            if table[closing] == -1:
+                stop[closing] = -1
+
+        stack = []
+        for index, token in enumerate(tokenlist):
+            if token.type == "LT":
+                stack.append(index)
+            elif token.type in ("GT", "RSHIFT"):
+                for x in range(2 if token.type == "RSHIFT" else 1):  # @UnusedVariable
+                    if stack:
+                        table[stack.pop()] = index
+        for opening in stack:
+            stop[opening] = last
+
+        # >> closes two < and matches the outer one
+        stack = []
+        for index in range(last, -1, -1):
+            token = tokenlist[index]
+            if token.type == "GT":
+                stack.append((index, True))
+            elif token.type == "RSHIFT":
+                stack.append((index, True))
+                stack.append((index, False))
+            elif token.type == "LT" and stack:
+                closing, outer = stack.pop()
+                if outer:
+                    table[closing] = index
+        for closing, outer in stack:
+            if outer:
+                stop[closing] = -1
+
+    def _GetSkipTable(self, forward, skipWhiteSpace, skipComment, skipDirective):
+        """
+        Get the table of the tokens which are not skipped by the navigation
+        with the given options. The table is built on the first use.
+        Going forward, the preprocessor tokens are skipped.
+        Going backward, the tokens in the lines starting with # are skipped.
+        """
+        if not skipDirective:
+            forward = True
+        key = (forward, skipWhiteSpace, skipComment, skipDirective)
+        table = self.skipTables.get(key)
+        if table is None:
+            context = self._SkipContext(skipWhiteSpace, skipComment)
+            if skipDirective and not forward and self.directiveLines is None:
+                self.directiveLines = [Search(r"^\s*#", line) is not None
+                                       for line in self.lines]
+            indices = []
+            for token in self.tokenlist:
+                if token.inactive or token.type in context:
+                    continue
+                if skipDirective:
+                    if forward and token.pp == True:
+                        continue
+                    if not forward and self.directiveLines[token.lineno - self.lineOffset - 1]:
+                        continue
+                indices.append(token.index)
+            table = _SkipTable(indices, self.tokenlistsize)
+            self.skipTables[key] = table
+        return table
 
     def _SkipContext(self, skipWhiteSpace=False,
                      skipComment=False):
@@ -835,6 +1413,16 @@ class CppLexerNavigator(object):
             self.tokenindex = self.tokenindex - 1
 
     def GetNextTokenInType(self, type, keepCur=False, skipPreprocess=True):
+        table = self.nextTokenTable.get(type) if skipPreprocess else None
+        if table is not None:
+            index = table[self.tokenindex + 1]
+            if index == -1:
+                if not keepCur:
+                    self.tokenindex = self.tokenlistsize - 1
+                return None
+            if not keepCur:
+                self.tokenindex = index
+            return self.tokenlist[index]
         if keepCur:
             self.PushTokenIndex()
         token = None
@@ -870,15 +1458,11 @@ class CppLexerNavigator(object):
     def HasBody(self):
         if self.GetCurToken() is None:
             return False
-        token_id2 = self.GetNextTokenInType("LBRACE", True)
-        token_id3 = self.GetNextTokenInType("SEMI", True)
-
-        if token_id3 is None and token_id2 is not None:
-            return True
-        if token_id2 is not None:
-            if token_id2.lexpos < token_id3.lexpos:
-                return True
-        return False
+        lbrace = self.nextTokenTable["LBRACE"][self.tokenindex + 1]
+        semi = self.nextTokenTable["SEMI"][self.tokenindex + 1]
+        if lbrace == -1:
+            return False
+        return semi == -1 or lbrace < semi
 
 
 class Context:
@@ -906,49 +1490,92 @@ class Context:
         return False
 
 
+class _ContextNode:
+    """
+    Node of the persistent ContextStack: the top context and the rest of the stack.
+    """
+    __slots__ = ("context", "parent", "size", "sigContext", "containsIn")
+
+    def __init__(self, context, parent):
+        self.context = context
+        self.parent = parent
+        if parent is None:
+            self.size = 1
+            self.sigContext = context if context.sig else None
+        else:
+            self.size = parent.size + 1
+            self.sigContext = context if context.sig else parent.sigContext
+        self.containsIn = {}
+
+
 class ContextStack:
+    """
+    Stack of the contexts a token is in.
+
+    The stack is a chain of nodes from the top context to the bottom one.
+    Push adds a node on top of the shared rest of the stack and Copy shares
+    all the nodes, so every token can keep its own stack without copying.
+    """
+
     def __init__(self):
-        self.contextstack = []
-        pass
+        self.top = None
+
+    @property
+    def contextstack(self):
+        """ List of the contexts from the bottom to the top """
+        contexts = []
+        node = self.top
+        while node is not None:
+            contexts.append(node.context)
+            node = node.parent
+        contexts.reverse()
+        return contexts
 
     def Push(self, context):
-        self.contextstack.append(context)
+        self.top = _ContextNode(context, self.top)
 
     def Pop(self):
-        if self.Size() == 0:
+        if self.top is None:
             return None
-        return self.contextstack.pop()
+        context = self.top.context
+        self.top = self.top.parent
+        return context
 
     def Peek(self):
-        if self.Size() == 0:
+        if self.top is None:
             return None
-        return self.contextstack[-1]
+        return self.top.context
 
     def SigPeek(self):
-        i = len(self.contextstack)
-        while(True):
-            if i == 0:
-                break
-            i -= 1
-            if self.contextstack[i].sig:
-                return self.contextstack[i]
-        return None
+        if self.top is None:
+            return None
+        return self.top.sigContext
 
     def Size(self):
-        return len(self.contextstack)
+        if self.top is None:
+            return 0
+        return self.top.size
 
     def IsEmpty(self):
-        return len(self.contextstack) == 0
+        return self.top is None
 
     def ContainsIn(self, type):
-        i = len(self.contextstack)
-        while(True):
-            if i == 0:
+        node = self.top
+        visited = []
+        result = False
+        while node is not None:
+            cached = node.containsIn.get(type)
+            if cached is not None:
+                result = cached
                 break
-            i -= 1
-            if self.contextstack[i].type == type:
-                return True
-        return False
+            visited.append(node)
+            if node.context.type == type:
+                result = True
+                break
+            node = node.parent
+        for node in visited:
+            node.containsIn[type] = result
+        return result
 
     def __str__(self):
         a = ""
@@ -958,7 +1585,7 @@ class ContextStack:
 
     def Copy(self):
         contextStack = ContextStack()
-        contextStack.contextstack = self.contextstack[:]
+        contextStack.top = self.top
         return contextStack
 
 
@@ -986,21 +1613,158 @@ class _ContextStackStack:
 # AddLineRule(lineRule)
 
 
-def ProcessFile(ruleManager, file, data=None):
-    #    print file
-    try:
-        lexer = CppLexerNavigator(file, data)
-    except UnicodeDecodeError:
-        # If an exception was thrown (i.e., UnicodeDecodeError), it was
-        # caught, process, logged to stdout, and the exception was raised
-        # again.  At this point in the code, there is nothing else to do
-        # other than skip the processing of the file, which is why we
-        # just return.
-        return
-    ConstructContextInfo(lexer)
+# Size of the text lexed at once when a file is streamed
+STREAM_WINDOW_SIZE = 1 << 18
+# Lines lexed before and after each window, which the rules can look at
+STREAM_MARGIN_LINES = 50
+
+
+def ProcessFile(ruleManager, file, data=None, sessionRules=False):
+    """
+    Check the file in the cheapest way for what the rules need. The file is
+    not lexed when the rules only need its name or its lines, and the context
+    is not constructed when they only need the tokens.
+    If sessionRules is True, the session file rules run before the file start
+    rules, once the rules suppressed in the file are known.
+    """
+    # No rules are suppressed in the files which are not read
+    nsiqcppstyle_state._nsiqcppstyle_state.ResetRuleSuppression()
+    if data is None and not ruleManager.NeedsLines():
+        # The rules which only need the name see the rules suppressed in the
+        # first comment, so only the file until it is read, whatever its size is
+        data = ReadFirstComment(file)
+    if data is None:
+        state = nsiqcppstyle_state._nsiqcppstyle_state
+        try:
+            size = os.path.getsize(file)
+        except OSError:
+            size = 0
+        wholeFileRules = ruleManager.GetWholeFileRules()
+        if state.streamSize and size > state.streamSize and not wholeFileRules:
+            console.Out.Verbose("Streaming %s (%d bytes)" % (file, size))
+            StreamFile(ruleManager, file, sessionRules=sessionRules)
+            return
+        if state.maxFileSize and size > state.maxFileSize:
+            console.Out.Ci("[ERROR] %s is not checked. It has %d bytes, over the max file size %d bytes"
+                           % (file, size, state.maxFileSize))
+            if wholeFileRules:
+                console.Out.Ci("[ERROR] These rules need the whole file: %s"
+                               % ", ".join(wholeFileRules))
+            if sessionRules:
+                RunSessionFileRules(ruleManager, file)
+            return
+    lexer = CppLexerNavigator(file, data, tokenize=ruleManager.NeedsTokens())
+    if ruleManager.NeedsContext():
+        ConstructContextInfo(lexer)
+    else:
+        ProcessRuleSuppression(lexer)
     # Run Rules
     lexer.Reset()
-    RunRules(ruleManager, lexer)
+    RunRules(ruleManager, lexer, sessionRules)
+
+
+def StreamFile(ruleManager, file, windowSize=STREAM_WINDOW_SIZE,
+               marginLines=STREAM_MARGIN_LINES, sessionRules=False):
+    """
+    Check the file window by window, so that only the lines and the tokens of
+    a window are kept in memory. Each window is lexed with the margin lines
+    before and after it, which the rules can look at, but the rules only run
+    on the tokens of the window. The windows are split at the line starts
+    given by GetWindowBreaks and the state of the #if blocks is carried over.
+    When the rules only need the lines, the windows are not lexed and split
+    at any line. The context is not constructed, so it's only for the rules
+    which don't need the whole file.
+    """
+    if marginLines < 0:
+        raise ValueError("marginLines must not be negative: %d" % marginLines)
+    tokenize = ruleManager.NeedsTokens()
+    lines = []
+    lineOffset = 0
+    begin = 0
+    ifdefFrames = []
+    lookahead = marginLines
+    started = False
+    eof = False
+    lexer = None
+    with OpenSource(file) as f:
+        while True:
+            size = sum(len(line) for line in lines[begin:])
+            while not eof and size < windowSize:
+                line = f.readline()
+                lines.append(line)
+                size += len(line)
+                eof = not line
+            limit = len(lines)
+            while not eof and len(lines) < limit + lookahead:
+                line = f.readline()
+                lines.append(line)
+                eof = not line
+            lexer = CppLexerNavigator(file, "".join(lines), lineOffset, ifdefFrames, tokenize)
+            if tokenize:
+                breaks = lexer.GetWindowBreaks()
+                breakLines = [lexer.tokenlist[index].lineno - lineOffset - 1 for index in breaks]
+                # The last lines are in a comment or a string which is not closed yet
+                closed = bool(breaks) and breakLines[-1] >= len(lines) - 1
+            else:
+                breaks = breakLines = list(range(len(lines) + 1))
+                # The first window has the whole first comment for the suppression
+                closed = started or _IsFirstCommentRead(lexer.data)
+            if not eof and not closed:
+                lookahead = max(1, lookahead * 2)
+                continue
+            endLine = None
+            if not eof:
+                endLine = ([line for line in breakLines if begin < line <= limit] or
+                           [line for line in breakLines if line > begin][:1])[-1]
+            if not started:
+                started = True
+                ProcessRuleSuppression(lexer)
+                RunFileStartRules(ruleManager, lexer, sessionRules)
+            RunRawLineRules(ruleManager, lexer, begin, endLine)
+            if tokenize:
+                lexer.tokenindex = breaks[breakLines.index(begin)] - 1 if begin > 0 else -1
+                RunTokenRules(ruleManager, lexer,
+                              None if endLine is None else breaks[breakLines.index(endLine)])
+            if endLine is None:
+                break
+            # The next window starts with the last lines of this window as its margin
+            first, firstLine = next((index, line) for index, line in zip(breaks, breakLines)
+                                    if line >= endLine - marginLines)
+            if tokenize:
+                ifdefFrames = lexer.GetIfdefFrames(first)
+            del lines[:firstLine]
+            lineOffset += firstLine
+            begin = endLine - firstLine
+            lookahead = marginLines
+    RunFileEndRules(ruleManager, lexer)
+
+
+def ProcessRuleSuppression(lexer):
+    """
+    Suppress the rules given as --RULE_NAME in the first comment of the file
+    """
+    nsiqcppstyle_state._nsiqcppstyle_state.ResetRuleSuppression()
+    if lexer.tokenized:
+        comment = lexer.GetNextTokenInTypeList(("COMMENT", "CPPCOMMENT"), True)
+    else:
+        comment = FindFirstComment(lexer.data)
+    if comment is not None:
+        for e in FindAll(r"--\s*(RULE\w*)", comment.value):
+            nsiqcppstyle_state._nsiqcppstyle_state.SuppressRule(e)
+
+
+def FindFirstComment(data):
+    """
+    Find the first comment of the data. The data is lexed only until the
+    comment, for the files which are not lexed for the rules.
+    """
+    lexer = _GetLexer()
+    lexer.input(data)
+    while True:
+        token = lexer.token()
+        if not token or token.type in ("COMMENT", "CPPCOMMENT"):
+            return token
+
 
 def ConstructContextInfo(lexer):
     #    classstate = None
@@ -1009,14 +1773,8 @@ def ConstructContextInfo(lexer):
     contextStackStack = _ContextStackStack()
     contextStackStack.Push(contextStack)
     contextPrediction = None
-    ppScope = False
-    prevLine = 0
     templateContext = None
-    nsiqcppstyle_state._nsiqcppstyle_state.ResetRuleSuppression()
-    comment = lexer.GetNextTokenInTypeList(("COMMENT", "CPPCOMMENT"), True)
-    if comment is not None:
-        for e in FindAll(r"--\s*(RULE\w*)", comment.value):
-            nsiqcppstyle_state._nsiqcppstyle_state.SuppressRule(e)
+    ProcessRuleSuppression(lexer)
     t = None
     # Construct Context
     while(True):
@@ -1027,20 +1785,6 @@ def ConstructContextInfo(lexer):
             t.contextStack = None
             t.context = None
 
-            if t.type == "PREPROCESSOR":
-                t.pp = True
-                ppScope = True
-            elif ppScope == True:
-                if prevLine == t.lineno - 1:
-                    prevToken = lexer.PeekPrevTokenSkipWhiteSpaceAndComment()
-                    if prevToken is not None:
-                        ppScope = (prevToken.type == "PREPROCESSORNEXT")
-                    t.pp = ppScope
-                elif prevLine == t.lineno:
-                    t.pp = True
-                else:
-                    ppScope = False
-
             if templateContext is not None and not templateContext.InScope(t):
                 templateContext = None
 
@@ -1200,26 +1944,66 @@ def ConstructContextInfo(lexer):
                     # print "TT", lexer.GetCurTokenLine(), impl,
                     # contextPrediction
             t.contextStack = contextStack
-            prevLine = t.lineno
         except Exception as e:
             console.Err.Verbose(
                 "Context Construction Error : ", t, t.contextStack, e)
             console.Err.Verbose(traceback.format_exc())
 
 
-def RunRules(ruleManager, lexer):
+def RunRules(ruleManager, lexer, sessionRules=False):
+    RunFileStartRules(ruleManager, lexer, sessionRules)
+    RunRawLineRules(ruleManager, lexer)
+    if ruleManager.NeedsTokens():
+        RunTokenRules(ruleManager, lexer)
+    RunFileEndRules(ruleManager, lexer)
+
+
+def RunSessionFileRules(ruleManager, filename):
+    """
+    Run the rules keeping state across the files, with the rules suppressed
+    in the file.
+    """
+    try:
+        ruleManager.RunSessionFileRule(os.path.basename(filename),
+                                       os.path.dirname(filename))
+    except Exception as e:
+        console.Err.Verbose("Rule Error : ", e)
+        console.Err.Verbose(traceback.format_exc())
+
+
+def RunFileStartRules(ruleManager, lexer, sessionRules=False):
+    if sessionRules:
+        RunSessionFileRules(ruleManager, lexer.filename)
     try:
         ruleManager.RunFileStartRule(lexer, os.path.basename(lexer.filename),
                                      os.path.dirname(lexer.filename))
     except Exception as e:
         console.Err.Verbose("Rule Error : ", e)
         console.Err.Verbose(traceback.format_exc())
+
+
+def RunRawLineRules(ruleManager, lexer, start=0, end=None):
+    """
+    Run the rules on the lines from start to end, the indexes of lexer.lines.
+    """
+    try:
+        ruleManager.RunRawLineRule(lexer, start, end)
+    except Exception as e:
+        console.Err.Verbose("Rule Error : ", e)
+        console.Err.Verbose(traceback.format_exc())
+
+
+def RunTokenRules(ruleManager, lexer, end=None):
+    """
+    Run the rules on the tokens after the current token.
+    If end is given, the rules run until the token index end.
+    """
     currentLine = 0
     t = None
     while(True):
         try:
             t = lexer.GetNextTokenSkipWhiteSpace()
-            if t is None:
+            if t is None or (end is not None and t.index >= end):
                 break
             if currentLine != t.lineno:
                 currentLine = t.lineno
@@ -1249,6 +2033,9 @@ def RunRules(ruleManager, lexer):
         except Exception as e:
             console.Err.Verbose("Rule Error : ", t, t.contextStack, e)
             console.Err.Verbose(traceback.format_exc())
+
+
+def RunFileEndRules(ruleManager, lexer):
     try:
         ruleManager.RunFileEndRule(lexer, os.path.basename(lexer.filename),
                                    os.path.dirname(lexer.filename))
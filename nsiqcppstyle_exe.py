@@ -30,11 +30,15 @@
 import getopt
 import re
 import copy
+import multiprocessing
+import traceback
 import nsiqcppstyle_checker
 from nsiqcppstyle_outputer import _consoleOutputer as console
 import nsiqcppstyle_state
 import nsiqcppstyle_rulemanager
 import nsiqcppstyle_reporter
+import nsiqcppstyle_cache
+import nsiqcppstyle_resultstore
 import updateagent.agent
 from nsiqcppstyle_util import *
 
@@ -65,7 +69,7 @@ Usage: nsiqcppstyle [Options]
   -h            Show this help
   -v            Show detail ouput(verbose mode)
   -r            Show rule list
-  -o path       Set the output path. It's only applied when the output is csv or xml.
+  -o path       Set the output path. It's only applied when the output is csv, xml, sarif, jsonl or store.
   -f path       Set the filefilter path. If not provided, it uses the default filterpath
                 (target/filefilter.txt)
                 If you provide the file path (not a folder path) for the target,
@@ -79,13 +83,44 @@ Usage: nsiqcppstyle [Options]
   --list-rules / -r  Show all rules available.
                 Add file extensions to be counted as assigned languages.
   -s            Assign Filter scope name to be applied in this analysis
-  --output=     output format 'emacs', 'vs7', 'csv', 'xml' and 'eclipse'. Default value is vs7
+  -j N          Check the files in N worker processes. 0 uses all the CPUs.
+                The violations are still reported in the order of the files.
+  --output=     output format 'emacs', 'vs7', 'csv', 'xml', 'eclipse', 'sarif', 'jsonl' and 'store'.
+                Default value is vs7
                 emacs, vs7, eclipse output the result on the stdout in the form
                 that each tool recognizes.
-                csv and xml outputs the result on the file "nsiqcppstyle_result.csv"
-                "nsiqcppstyle_result.xml" respectively, if you don't provide -o option.
+                csv, xml, sarif and jsonl output the result on the file
+                "nsiqcppstyle_report.csv", "nsiqcppstyle_report.xml",
+                "nsiqcppstyle_report.sarif" and "nsiqcppstyle_report.jsonl"
+                respectively, if you don't provide -o option.
+                jsonl writes one violation per line as it's found, or with -j or
+                --cache-dir, the violations of each file once it's checked.
+                csv is compressed with gzip when the -o path ends with ".gz".
+                store writes the compact binary result store "nsiqcppstyle_report.nsr",
+                which --convert and --diff read.
   --ci          Continuous Integration mode. If this mode is on, this tool only reports summary.
   --quiet / -q  Quiet mode. If this mode is on, this tool only reports errors.
+  --cache-dir=path
+                Keep the violations of each file in the given folder. Files whose
+                content, rules and variables are unchanged are not checked again.
+  --lextab      Keep the precompiled lexer table in the nsiqcppstyle folder.
+                The first run writes it and later runs load it to start faster.
+  --stream-size=size
+                Check the files over this size (default 16M) window by window in
+                bounded memory, if none of the rules needs the whole file.
+  --max-file-size=size
+                Don't check the files over this size (default 256M) which can't be
+                streamed, they are reported as errors. 0 turns the limit off.
+  --convert     Report the violations of the result store given instead of the
+                target in the --output format.
+                ex) nsiqcppstyle --convert --output=csv -o report.csv report.nsr
+  --diff        Report the violations of the new result store which are not in
+                the old one in the --output format, given the old and new stores
+                instead of the target. The violations are compared by their file,
+                rule and message, so the ones only moved to the other lines are
+                not reported. The files are compared by their paths in the
+                targets, so the stores of the different checkouts can be compared.
+                ex) nsiqcppstyle --diff old.nsr new.nsr
 
 * nsiqcppstyle reports coding standard violations on C/C++ source code.
 * In default, it doesn't apply any rules on the source. If you want to apply rule,
@@ -133,9 +168,11 @@ def main(argv=None):
         argv = sys.argv
     try:
         try:
-            opts, args = getopt.getopt(argv[1:], "o: s: hqvrf: ", ["help", "csv",
+            opts, args = getopt.getopt(argv[1:], "o: s: hqvrf: j: ", ["help", "csv",
                                                                       "output=", "list_rules", "verbose=", "show-url", "no-update",
-                                                                      "ci", "quiet", "var=", "noBase", "filter-string="])
+                                                                      "ci", "quiet", "var=", "noBase", "filter-string=",
+                                                                      "lextab", "cache-dir=", "stream-size=",
+                                                                      "max-file-size=", "convert", "diff"])
         except getopt.error as msg:
             raise ShowMessageAndExit(msg)
 
@@ -145,6 +182,10 @@ def main(argv=None):
         filterPath = ""
         filterStringList = []
         noBase = False
+        useLexTab = False
+        jobs = 1
+        cacheDir = None
+        storeCommand = None
         varMap = {}
         extLangMap = {
             "Html": {"htm", "html"},
@@ -175,13 +216,20 @@ def main(argv=None):
                 console.SetLevel(console.Level.Verbose)
             elif o == "-s":
                 filterScope = a
+            elif o == "-j":
+                try:
+                    jobs = int(a)
+                except ValueError:
+                    ShowMessageAndExit("-j should be followed by the number of jobs")
+                if jobs <= 0:
+                    jobs = multiprocessing.cpu_count()
             elif o == "--show-url":
                 _nsiqcppstyle_state.showUrl = True
             elif o == '--output':
-                if not a in ('emacs', 'vs7', 'csv', 'xml', 'eclipse'):
+                if not a in ('emacs', 'vs7', 'csv', 'xml', 'eclipse', 'sarif', 'jsonl', 'store'):
                     print(title)
                     ShowMessageAndExit(
-                        'The only allowed output formats are emacs, vs7 and csv.')
+                        'The only allowed output formats are emacs, vs7, eclipse, csv, xml, sarif, jsonl and store.')
                 _nsiqcppstyle_state.output_format = a
             elif o == "--var":
                 varMap = GetCustomKeyValueMap(a, "--var=" + a)
@@ -191,10 +239,22 @@ def main(argv=None):
                 console.SetLevel(console.Level.Error)
             elif o == "--noBase":
                 noBase = True
+            elif o == "--lextab":
+                useLexTab = True
+            elif o == "--cache-dir":
+                cacheDir = os.path.realpath(a.strip().replace("\"", ""))
+            elif o == "--stream-size":
+                _nsiqcppstyle_state.streamSize = GetFileSizeOption(a, o)
+            elif o == "--max-file-size":
+                _nsiqcppstyle_state.maxFileSize = GetFileSizeOption(a, o)
+            elif o in ("--convert", "--diff"):
+                storeCommand = o
 
         console.Out.Ci(title)
         runtimePath = GetRuntimePath()
         sys.path.append(runtimePath)
+        if useLexTab:
+            nsiqcppstyle_checker.EnableLexTab(runtimePath)
         if updateNsiqCppStyle:
             console.Out.Ci(console.Separator)
             try:
@@ -202,6 +262,9 @@ def main(argv=None):
             except Exception as e:
                 console.Out.Error(e)
 
+        if storeCommand is not None:
+            return RunStoreCommand(storeCommand, args, outputPath)
+
         targetPaths = GetRealTargetPaths(args)
         if len(targetPaths) == 0:
             ShowMessageAndExit("No target paths provided")
@@ -226,16 +289,16 @@ def main(argv=None):
         cExtendstionSet = extLangMap.get("C/C++")
 
         nsiqcppstyle_reporter.PrepareReport(outputPath,
-                                            _nsiqcppstyle_state.output_format)
+                                            _nsiqcppstyle_state.output_format,
+                                            version)
         analyzedFiles = []
         filter = None
 
+        # Collect the filter and the files of all the targets first, so that
+        # the files of all the targets are checked by the same worker processes
+        targets = []
         for targetPath in targetPaths:
-            nsiqcppstyle_reporter.StartTarget(targetPath)
             extLangMapCopy = copy.deepcopy(extLangMap)
-            targetName = os.path.basename(targetPath)
-            console.Out.Ci(console.Separator)
-            console.Out.Ci("=  Analyzing %s " % targetName)
 
             if filterPath != "":
                 filefilterPath = filterPath
@@ -258,32 +321,18 @@ def main(argv=None):
                                   % (filterScope, filterManager.GetActiveFilter().filterName))
 
             filter = filterManager.GetActiveFilter()
-            # Load Rule
-
             if len(filter.nsiqCppStyleRules) == 0:
                 ShowMessageAndExit("Error!. Rules must be set in %s" % filefilterPath,
                                    False)
                 continue
 
-            ruleManager.LoadRules(filter.nsiqCppStyleRules)
-            ruleManager.RunSessionStartRules()
-
-            _nsiqcppstyle_state.checkers = filter.nsiqCppStyleRules
-            _nsiqcppstyle_state.varMap = filter.varMap
-            nsiqcppstyle_reporter.ReportRules(ruleManager.availRuleNames,
-                                              filter.nsiqCppStyleRules)
-
-            console.Out.Info(filter.to_string())
-            console.Out.Ci(console.Separator)
-            console.Out.Verbose(
-                "* run nsiqcppstyle analysis on %s" %
-                targetName)
-
+            # Collect the files to be analyzed in the order of the report
+            targetFiles = []
             # if the target is file, analyze it without condition
             if os.path.isfile(targetPath):
                 fileExtension = targetPath[targetPath.rfind('.') + 1:]
                 if fileExtension in cExtendstionSet:
-                    ProcessFile(ruleManager, targetPath, analyzedFiles)
+                    targetFiles.append((targetPath, None))
 
             # if the target is directory, analyze it with filefilter and
             # basefilelist
@@ -304,12 +353,53 @@ def main(argv=None):
                         if (fileExtension in cExtendstionSet and
                                 basefilelist.IsNewOrChanged(eachFile) and
                                 filter.CheckFileInclusion(basePart)):
-                            nsiqcppstyle_reporter.StartFile(os.path.dirname(basePart),
-                                                            fname)
-                            ProcessFile(ruleManager, eachFile, analyzedFiles)
-                            nsiqcppstyle_reporter.EndFile()
-            ruleManager.RunProjectRules(targetPath)
-            nsiqcppstyle_reporter.EndTarget()
+                            targetFiles.append((eachFile, basePart))
+
+            cache = None
+            if cacheDir is not None:
+                cache = nsiqcppstyle_cache.ResultCache(cacheDir,
+                                                       nsiqcppstyle_cache.GetConfigKey(ruleManager,
+                                                                                       filter.nsiqCppStyleRules,
+                                                                                       filter.varMap, version))
+            targets.append((targetPath, filter, targetFiles, cache))
+
+        # One queue of the files of all the targets, so that a small target
+        # does not leave the worker processes idle
+        tasks = [(eachFile, index) for index, (targetPath, filter, targetFiles, cache) in enumerate(targets)
+                 for eachFile, basePart in targetFiles]
+        pool = None
+        checkedFiles = None
+        if jobs > 1 and len(tasks) > 1:
+            pool = CreateWorkerPool(jobs, targets)
+            checkedFiles = pool.imap(CheckFileInWorker, tasks, WORKER_CHUNK_SIZE)
+        try:
+            for targetPath, filter, targetFiles, cache in targets:
+                nsiqcppstyle_reporter.StartTarget(targetPath)
+                targetName = os.path.basename(targetPath)
+                console.Out.Ci(console.Separator)
+                console.Out.Ci("=  Analyzing %s " % targetName)
+
+                # Load Rule
+                ruleManager.LoadRules(filter.nsiqCppStyleRules)
+                ruleManager.RunSessionStartRules()
+
+                _nsiqcppstyle_state.checkers = filter.nsiqCppStyleRules
+                _nsiqcppstyle_state.varMap = filter.varMap
+                nsiqcppstyle_reporter.ReportRules(ruleManager.availRuleNames,
+                                                  filter.nsiqCppStyleRules)
+
+                console.Out.Info(filter.to_string())
+                console.Out.Ci(console.Separator)
+                console.Out.Verbose(
+                    "* run nsiqcppstyle analysis on %s" %
+                    targetName)
+
+                ProcessFiles(ruleManager, targetFiles, analyzedFiles, checkedFiles, cache)
+                ruleManager.RunProjectRules(targetPath)
+                nsiqcppstyle_reporter.EndTarget()
+        finally:
+            if pool is not None:
+                pool.terminate()
 
         nsiqcppstyle_reporter.ReportSummaryToScreen(analyzedFiles,
                                                     _nsiqcppstyle_state, filter)
@@ -325,12 +415,120 @@ def main(argv=None):
 
 # 3
 
-def ProcessFile(ruleManager, file, analyzedFiles):
+def ProcessFiles(ruleManager, targetFiles, analyzedFiles, checkedFiles=None, cache=None):
+    """
+    Analyze the (file path, path relative to the target) pairs.
+    If checkedFiles is given, it yields the violations of the files in the order
+    of targetFiles, which are checked in the worker processes and reported here.
+    If the result cache is given, unchanged files are not checked again.
+    """
+    for eachFile, basePart in targetFiles:
+        checked = None
+        if checkedFiles is not None:
+            checked = next(checkedFiles)
+        if basePart is not None:
+            nsiqcppstyle_reporter.StartFile(os.path.dirname(basePart),
+                                            os.path.basename(eachFile))
+        ProcessFile(ruleManager, eachFile, analyzedFiles, checked, cache)
+        if basePart is not None:
+            nsiqcppstyle_reporter.EndFile()
+
+
+def ProcessFile(ruleManager, file, analyzedFiles, checked=None, cache=None):
+    """
+    Analyze the file. If its (violations, suppressed rules) are given, the file
+    has already been checked by a worker process and only the merge step is done here.
+    Without them and the result cache, the violations are reported as the file is checked.
+    """
     console.Out.Info("Processing: ", file)
-    nsiqcppstyle_checker.ProcessFile(ruleManager, file)
+    if checked is None and cache is None:
+        # Nothing to keep or to merge, so the violations are reported as they are found
+        nsiqcppstyle_checker.ProcessFile(ruleManager, file, sessionRules=True)
+        analyzedFiles.append(file)
+        return
+    if checked is None:
+        checked = nsiqcppstyle_cache.CheckFile(ruleManager, file, cache)
+    violations, suppressedRules = checked
+    # Merge step. Rules keeping state across files always run in this process
+    # in the order of the files, with the rules suppressed in the file.
+    _nsiqcppstyle_state.SetSuppressedRules(suppressedRules)
+    nsiqcppstyle_checker.RunSessionFileRules(ruleManager, file)
+    nsiqcppstyle_reporter.ReportViolations(violations)
     analyzedFiles.append(file)
 
 
+##########################################################################
+# Worker Processes
+##########################################################################
+WORKER_CHUNK_SIZE = 4
+
+
+_workerTargets = None
+_workerTarget = None
+
+
+def CreateWorkerPool(jobs, targets):
+    """
+    Create the worker processes which check the files of the targets,
+    given as (target path, filter, files, cache)
+    """
+    # Forked workers must not inherit pending output
+    nsiqcppstyle_reporter.FlushReport()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    return multiprocessing.Pool(jobs, InitWorker,
+                                ([(filter.nsiqCppStyleRules, filter.varMap, cache)
+                                  for targetPath, filter, targetFiles, cache in targets],
+                                 console.GetLevel(),
+                                 (_nsiqcppstyle_state.streamSize, _nsiqcppstyle_state.maxFileSize)))
+
+
+def InitWorker(targets, consoleLevel, fileSizes):
+    """
+    Keep the (rules, variables, cache) of each target in the worker process
+    """
+    global _workerTargets
+    _workerTargets = targets
+    _nsiqcppstyle_state.streamSize, _nsiqcppstyle_state.maxFileSize = fileSizes
+    console.SetLevel(consoleLevel)
+
+
+def LoadWorkerRules(target):
+    """
+    Load the rules of the target in the worker process. The rule modules
+    are not imported again when the targets have the same rules.
+    """
+    global _workerTarget
+    ruleNames, varMap, cache = _workerTargets[target]
+    consoleLevel = console.GetLevel()
+    # The main process has already shown the rule loading messages
+    console.SetLevel(console.Level.Error)
+    try:
+        nsiqcppstyle_rulemanager.ruleManager.LoadRules(ruleNames)
+    finally:
+        console.SetLevel(consoleLevel)
+    _nsiqcppstyle_state.checkers = ruleNames
+    _nsiqcppstyle_state.varMap = varMap
+    _workerTarget = target
+
+
+def CheckFileInWorker(task):
+    """
+    Check the file of the (file, target index) task and return its
+    (violations, suppressed rules) to the main process
+    """
+    file, target = task
+    try:
+        if target != _workerTarget:
+            LoadWorkerRules(target)
+        return nsiqcppstyle_cache.CheckFile(nsiqcppstyle_rulemanager.ruleManager,
+                                            file, _workerTargets[target][2])
+    except Exception as e:
+        console.Err.Error("Error while checking %s :" % file, e)
+        console.Err.Verbose(traceback.format_exc())
+        return [], []
+
+
 def Update():
     console.Out.Error("Development in progress. Please check manually")
     """
@@ -339,6 +537,41 @@ def Update():
     """
 
 
+def RunStoreCommand(command, storePaths, outputPath):
+    """
+    Report the violations of the result store in the output format (--convert)
+    or the violations of the new result store which are not in the old one (--diff)
+    """
+    storeCount = 1 if command == "--convert" else 2
+    if len(storePaths) != storeCount:
+        ShowMessageAndExit("%s needs %s" % (command, "the result store" if storeCount == 1
+                                            else "the old and the new result stores"))
+    for eachPath in storePaths:
+        if not os.path.isfile(eachPath):
+            ShowMessageAndExit("Error!: Result store (%s) does not exist" % eachPath, False)
+    outputFormat = _nsiqcppstyle_state.output_format
+    if outputFormat == "store":
+        ShowMessageAndExit("The result store is reported in the other output formats")
+
+    nsiqcppstyle_reporter.PrepareReport(GetOutputPath(storePaths[-1], outputPath),
+                                        outputFormat, version)
+    try:
+        if command == "--convert":
+            reader = nsiqcppstyle_resultstore.ResultStoreReader(storePaths[0])
+            nsiqcppstyle_reporter.ReportViolations(reader.Violations())
+            console.Out.Ci(" ** Total Converted Violations: %d" % _nsiqcppstyle_state.error_count)
+        else:
+            newViolations, fixedViolations = nsiqcppstyle_resultstore.DiffResultStores(*storePaths)
+            nsiqcppstyle_reporter.ReportViolations(newViolations)
+            console.Out.Ci(" ** Total New Violations      : %d" % len(newViolations))
+            console.Out.Ci(" ** Total Fixed Violations    : %d" % len(fixedViolations))
+    except ValueError as e:
+        ShowMessageAndExit(e, False)
+    finally:
+        nsiqcppstyle_reporter.CloseReport(outputFormat)
+    return _nsiqcppstyle_state.error_count
+
+
 def GetOutputPath(outputBasePath, outputPath):
     "Returns the LOC and complexity result path"
     if outputPath == "":
@@ -583,6 +816,20 @@ Current File extension and Language Settings
                 self.varMap[eachVar] = varMap[eachVar]
 
 
+def GetFileSizeOption(value, option):
+    """
+    Get the size in bytes of the option value, which may end with K, M or G
+    """
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    value = value.strip().upper()
+    try:
+        if value[-1:] in units:
+            return int(value[:-1]) * units[value[-1]]
+        return int(value)
+    except ValueError:
+        ShowMessageAndExit("%s should be followed by the size, e.g. %s=64M" % (option, option))
+
+
 def GetCustomKeyValueMap(keyValuePair, where):
     varMap = {}
     customKeyValues = keyValuePair.split(",")
@@ -63,6 +63,18 @@ class LexError(Exception):
 
 
 class LexToken(object):
+    # Fixed layout for the attributes of the lexer and the ones
+    # CppLexerNavigator and ConstructContextInfo add to each token.
+    # There are many tokens per file, so they do not carry a __dict__.
+    __slots__ = ("type", "value", "lineno", "lexpos", "lexer", "additional",
+                 "column", "index", "inactive", "filename", "pp",
+                 "contextStack", "context", "fullName", "decl", "navigator")
+
+    @property
+    def line(self):
+        # The line is sliced from the source when it's used
+        return self.navigator.GetLine(self.lineno)
+
     def __str__(self):
         return "LexToken(%s,%r,%d,%d,%d, %s, %s)" % (self.type, self.value,
                                                      self.lineno, self.column,
@@ -50,6 +50,9 @@ class ConsoleOuputer:
     def IsLevelDisplayed(self, level):
         return level >= self.__level
 
+    def GetLevel(self):
+        return self.__level
+
     def SetLevel(self, level):
         self.__level = level
         self.Out.SetLoggerLevel(level)
@@ -73,21 +76,37 @@ class ConsoleOuputer:
             # Add consoleHandler to logger
             self.__logger.addHandler(consoleHandler)
 
+            # Called before a message is written
+            self.__beforeWrite = None
+
         def Verbose(self, *msgArgs):
-            self.__logger.debug(self.__Format(*msgArgs))
+            self.__Log(logging.DEBUG, msgArgs)
 
         def Info(self, *msgArgs):
-            self.__logger.info(self.__Format(*msgArgs))
+            self.__Log(logging.INFO, msgArgs)
 
         def Ci(self, *msgArgs):
-            self.__logger.warning(self.__Format(*msgArgs))
+            self.__Log(logging.WARNING, msgArgs)
 
         def Error(self, *msgArgs):
-            self.__logger.error(self.__Format(*msgArgs))
+            self.__Log(logging.ERROR, msgArgs)
 
         def SetLoggerLevel(self, level):
             self.__logger.setLevel(level)
 
+        def SetBeforeWrite(self, callback):
+            """
+            Set the function called before a message is written, e.g. to
+            write the output buffered elsewhere first
+            """
+            self.__beforeWrite = callback
+
+        def __Log(self, level, msgArgs):
+            if self.__logger.isEnabledFor(level):
+                if self.__beforeWrite is not None:
+                    self.__beforeWrite()
+                self.__logger.log(level, self.__Format(*msgArgs))
+
         def __Format(self, *msgArgs):
             # Format output the same way a direct call to print would
             return ' '.join(str(a) for a in msgArgs)
@@ -29,33 +29,70 @@ import nsiqcppstyle_state
 import nsiqcppstyle_checker
 from nsiqcppstyle_outputer import _consoleOutputer as console
 import nsiqcppstyle_rulemanager
+import nsiqcppstyle_resultstore
 import sys
 import csv
 import os
+import atexit
+import gzip
+import json
+import pathlib
 
 ##########################################################################
 csvfile = None
 writer = None
 target = None
+toolVersion = ""
+sarifRuleIndex = None
+sarifResultCount = 0
+# The csv rows of the current file, which are written together
+csvRows = []
 
+# The size of the report which is kept before it's written
+OUTPUT_BUFFER_SIZE = 1 << 20
 
-def PrepareReport(outputPath, format):
+
+def PrepareReport(outputPath, format, version=""):
     """
     Set up sth like report headers
     """
     global writer
+    global csvfile
+    global toolVersion
+    global sarifRuleIndex
+    global sarifResultCount
+    toolVersion = version
     if format == "csv":
         if os.path.isdir(outputPath):
             outputPath = os.path.join(outputPath, "nsiqcppstyle_report.csv")
-        csvfile = open(outputPath, "wb")
+        if outputPath.endswith(".gz"):
+            csvfile = gzip.open(outputPath, "wt", compresslevel=6, newline="")
+        else:
+            csvfile = open(outputPath, "w", OUTPUT_BUFFER_SIZE, newline="")
+        del csvRows[:]
         writer = csv.writer(csvfile)
         writer.writerow(("File", "Line", "Column",
                          "Message", "Rule", "Rule Url"))
     elif format == "xml":
         if os.path.isdir(outputPath):
             outputPath = os.path.join(outputPath, "nsiqcppstyle_report.xml")
-        writer = open(outputPath, "w")
+        writer = open(outputPath, "w", OUTPUT_BUFFER_SIZE)
         writer.write("<?xml version='1.0'?>\n<checkstyle version='4.4'>\n")
+    elif format == "sarif":
+        if os.path.isdir(outputPath):
+            outputPath = os.path.join(outputPath, "nsiqcppstyle_report.sarif")
+        writer = open(outputPath, "w", OUTPUT_BUFFER_SIZE)
+        sarifRuleIndex = None
+        sarifResultCount = 0
+    elif format == "jsonl":
+        if os.path.isdir(outputPath):
+            outputPath = os.path.join(outputPath, "nsiqcppstyle_report.jsonl")
+        # Line buffered, so that the report can be followed during the run
+        writer = open(outputPath, "w", 1)
+    elif format == "store":
+        if os.path.isdir(outputPath):
+            outputPath = os.path.join(outputPath, "nsiqcppstyle_report.nsr")
+        writer = nsiqcppstyle_resultstore.ResultStoreWriter(outputPath)
 
 
 def ReportSummaryToScreen(analyzedFiles, nsiqcppstyle_state, filter):
@@ -100,10 +137,45 @@ def ReportSummaryToScreen(analyzedFiles, nsiqcppstyle_state, filter):
 
 
 def CloseReport(format):
-    if format == "xml":
-        global writer
+    FlushReport()
+    global writer
+    if format == "csv":
+        global csvfile
+        csvfile.close()
+        csvfile = None
+        writer = None
+    elif format == "xml":
         writer.write("</checkstyle>\n")
         writer.close()
+    elif format == "sarif":
+        StartSarifRun(nsiqcppstyle_rulemanager.ruleManager.availRuleNames)
+        writer.write("\n]}]}\n")
+        writer.close()
+    elif format in ("jsonl", "store"):
+        writer.close()
+
+
+def FlushReport():
+    """
+    Write the violations kept in the buffer. It's called before any console
+    message, so that the output keeps its order, and at the exit.
+    """
+    global outputLines
+    global outputSize
+    if csvRows:
+        WriteCsvRows()
+    if outputLines:
+        lines = outputLines
+        outputLines = []
+        outputSize = 0
+        sys.stdout.write("".join(lines))
+        sys.stdout.flush()
+    for eachFile in (csvfile, writer):
+        if eachFile is not None and hasattr(eachFile, "flush") and not eachFile.closed:
+            # Flushing a compressed file ends its deflate block, so it's
+            # only written when it's closed
+            if not isinstance(getattr(eachFile, "buffer", None), gzip.GzipFile):
+                eachFile.flush()
 ##########################################################################
 
 # ruleMap = {}
@@ -117,7 +189,8 @@ def IsRuleUsed(ruleName, ruleNames):
 
 
 def ReportRules(availRuleName, ruleNames):
-    pass
+    if _nsiqcppstyle_state.output_format == 'sarif':
+        StartSarifRun(availRuleName)
     # global ruleMap
     # ruleMap = {}
     # index = 0
@@ -135,6 +208,36 @@ def ReportRules(availRuleName, ruleNames):
     # ===========================================================================
 
 
+def StartSarifRun(availRuleNames):
+    """
+    Write the run metadata of the SARIF report, which is written only once.
+    The results are written one by one after it.
+    """
+    global sarifRuleIndex
+    if sarifRuleIndex is not None:
+        return
+    sarifRuleIndex = {}
+    rules = []
+    for eachRuleName in availRuleNames:
+        sarifRuleIndex[eachRuleName] = len(rules)
+        rules.append({"id": eachRuleName,
+                      "helpUri": "http://nsiqcppstyle.appspot.com/rule_doc/" + eachRuleName,
+                      "properties": {"version": nsiqcppstyle_rulemanager.ruleManager.GetRuleVersion(eachRuleName)}})
+    driver = {"name": "nsiqcppstyle", "version": toolVersion, "rules": rules}
+    header = json.dumps({"$schema": "https://json.schemastore.org/sarif-2.1.0.json",
+                         "version": "2.1.0",
+                         "runs": [{"tool": {"driver": driver}}]})
+    # Cut the closing "}]}" to leave the run open for the results,
+    # which CloseReport closes.
+    writer.write(header[:-3] + ', "results": [')
+
+
+def GetSarifUri(filename):
+    if os.path.isabs(filename):
+        return pathlib.Path(filename).as_uri()
+    return filename.replace(os.sep, "/")
+
+
 def StartDir(dirname):
     if _nsiqcppstyle_state.output_format == 'xml':
         pass
@@ -152,6 +255,8 @@ def StartTarget(targetname):
     if _nsiqcppstyle_state.output_format == 'xml':
         global target
         target = targetname
+    elif _nsiqcppstyle_state.output_format == 'store':
+        writer.SetTarget(targetname)
 #  writer.write("<target name='%s'>\n" % (targetname))
 
 
@@ -170,6 +275,16 @@ def StartFile(dirname, filename):
 def EndFile():
     if _nsiqcppstyle_state.output_format == 'xml':
         writer.write("</file>\n")
+    elif _nsiqcppstyle_state.output_format == 'csv':
+        WriteCsvRows()
+
+
+def WriteCsvRows():
+    """
+    Write the csv rows kept for the current file
+    """
+    writer.writerows(csvRows)
+    del csvRows[:]
 
 
 _nsiqcppstyle_state = nsiqcppstyle_state._nsiqcppstyle_state
@@ -210,28 +325,116 @@ def ErrorInternal(t, ruleName, message):
 
     if t is None:
         return
-    if nsiqcppstyle_checker.Search(r"//\s*NS", t.line) is None and \
-            not _nsiqcppstyle_state.CheckRuleSuppression(ruleName):
-        _nsiqcppstyle_state.IncrementErrorCount(ruleName, t.filename)
-        url = ""
-        if _nsiqcppstyle_state.showUrl:
-            url = "http://nsiqcppstyle.appspot.com/rule_doc/" + ruleName
-        if _nsiqcppstyle_state.output_format == 'emacs':
-            sys.stdout.write('%s:%s:  %s  [%s] %s\n' % (t.filename, t.lineno,
-                                                        message, ruleName, url))
-        elif _nsiqcppstyle_state.output_format == 'vs7':
-            sys.stdout.write('%s(%s, %s):  %s  [%s] %s\n' % (t.filename, t.lineno,
-                                                             t.column, message, ruleName, url))
-        elif _nsiqcppstyle_state.output_format == 'eclipse':
-            sys.stdout.write('  File "%s", line %d %s (%s)\n' %
-                             (t.filename, t.lineno, message, ruleName))
-        elif _nsiqcppstyle_state.output_format == 'csv':
-            global writer
-            writer.writerow(
-                (t.filename, t.lineno, t.column, message, ruleName, url))
-        elif _nsiqcppstyle_state.output_format == 'xml':
-            writer.write("""<error line='%d' col='%d' severity='warning' message='%s' source='%s'/>\n""" %
-                         (t.lineno, t.column, escape(message).replace("'", "\""), ruleName))
+    navigator = getattr(t, "navigator", None)
+    if navigator is not None:
+        suppressed = navigator.IsSuppressed(t.lineno, ruleName)
+    else:
+        suppressed = nsiqcppstyle_checker.IsRuleSuppressed(
+            nsiqcppstyle_checker.GetLineSuppression(t.line), ruleName) or \
+            _nsiqcppstyle_state.CheckRuleSuppression(ruleName)
+    if not suppressed:
+        if recordedViolations is not None:
+            recordedViolations.append((t.filename, t.lineno, t.column,
+                                       ruleName, message))
+        else:
+            ReportViolation(t.filename, t.lineno, t.column, ruleName, message)
+
+
+def ReportViolation(filename, lineno, column, ruleName, message):
+    """
+    Count the violation and write it in the current output format
+    """
+    _nsiqcppstyle_state.IncrementErrorCount(ruleName, filename)
+    url = ""
+    if _nsiqcppstyle_state.showUrl:
+        url = "http://nsiqcppstyle.appspot.com/rule_doc/" + ruleName
+    if _nsiqcppstyle_state.output_format == 'emacs':
+        WriteOutput('%s:%s:  %s  [%s] %s\n' % (filename, lineno,
+                                                message, ruleName, url))
+    elif _nsiqcppstyle_state.output_format == 'vs7':
+        WriteOutput('%s(%s, %s):  %s  [%s] %s\n' % (filename, lineno,
+                                                     column, message, ruleName, url))
+    elif _nsiqcppstyle_state.output_format == 'eclipse':
+        WriteOutput('  File "%s", line %d %s (%s)\n' %
+                    (filename, lineno, message, ruleName))
+    elif _nsiqcppstyle_state.output_format == 'csv':
+        csvRows.append((filename, lineno, column, message, ruleName, url))
+    elif _nsiqcppstyle_state.output_format == 'xml':
+        writer.write("""<error line='%d' col='%d' severity='warning' message='%s' source='%s'/>\n""" %
+                     (lineno, column, escape(message).replace("'", "\""), ruleName))
+    elif _nsiqcppstyle_state.output_format == 'sarif':
+        global sarifResultCount
+        StartSarifRun(nsiqcppstyle_rulemanager.ruleManager.availRuleNames)
+        separator = ",\n" if sarifResultCount else "\n"
+        sarifResultCount += 1
+        result = {"ruleId": ruleName,
+                  "level": "warning",
+                  "message": {"text": message},
+                  "locations": [{"physicalLocation": {
+                      "artifactLocation": {"uri": GetSarifUri(filename)},
+                      "region": {"startLine": lineno, "startColumn": max(column, 1)}}}]}
+        if ruleName in sarifRuleIndex:
+            result["ruleIndex"] = sarifRuleIndex[ruleName]
+        writer.write(separator + json.dumps(result))
+    elif _nsiqcppstyle_state.output_format == 'jsonl':
+        writer.write(json.dumps({"file": filename, "line": lineno, "column": column,
+                                 "rule": ruleName, "message": message, "url": url}) + "\n")
+    elif _nsiqcppstyle_state.output_format == 'store':
+        writer.Add(filename, lineno, column, ruleName, message)
+
+
+outputLines = []
+outputSize = 0
+
+
+def WriteOutput(line):
+    """
+    Keep the line of the screen output in the buffer, which is written when it's full
+    """
+    global outputSize
+    outputLines.append(line)
+    outputSize += len(line)
+    if outputSize >= OUTPUT_BUFFER_SIZE:
+        FlushReport()
+
+
+console.Out.SetBeforeWrite(FlushReport)
+console.Err.SetBeforeWrite(FlushReport)
+atexit.register(FlushReport)
+
+
+##########################################################################
+# Violation Recording
+##########################################################################
+recordedViolations = None
+
+
+def StartRecording():
+    """
+    Record the violations instead of writing them.
+    Worker processes record the violations of each file, and the main process
+    reports them with ReportViolations in the order of the files.
+    """
+    global recordedViolations
+    recordedViolations = []
+
+
+def StopRecording():
+    """
+    Stop recording and return the violations recorded since StartRecording
+    """
+    global recordedViolations
+    violations = recordedViolations
+    recordedViolations = None
+    return violations
+
+
+def ReportViolations(violations):
+    """
+    Report the recorded violations
+    """
+    for eachViolation in violations:
+        ReportViolation(*eachViolation)
 
 
 Error = ErrorInternal
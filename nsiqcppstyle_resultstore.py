@@ -0,0 +1,282 @@
+# Copyright (c) 2022 All rights reserved.
+# SPDX-License-Identifier: GPL-2.0-only
+
+import array
+import collections
+import itertools
+import os
+import struct
+import sys
+
+# The result store keeps the violations in blocks of columns.
+# Each block starts with the number of its violations and of the target roots,
+# file paths, rule names and messages seen first in it, followed by these
+# strings, the targetIds of the new files and the fileId, line, column,
+# ruleId and messageId columns of uint32.
+# The file paths are relative to the root of their target, so that the
+# stores of the checkouts in different directories can be compared.
+MAGIC = b"NSRS"
+VERSION = 2
+BLOCK_SIZE = 1 << 16
+
+_HEADER = struct.Struct("<4sI")
+_BLOCK_HEADER = struct.Struct("<IIIII")
+_UINT32 = "I" if array.array("I").itemsize == 4 else "L"
+
+
+def _ToBytes(values):
+    if sys.byteorder == "big":
+        values = array.array(_UINT32, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _ReadArray(f, count):
+    values = array.array(_UINT32)
+    data = f.read(count * 4)
+    if len(data) != count * 4:
+        raise ValueError("%s is truncated" % f.name)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def _WriteStrings(f, strings):
+    data = [eachString.encode("utf-8", "surrogateescape") for eachString in strings]
+    f.write(_ToBytes(array.array(_UINT32, [len(eachData) for eachData in data])))
+    f.write(b"".join(data))
+
+
+def _ReadStrings(f, count):
+    lengths = _ReadArray(f, count)
+    data = f.read(sum(lengths))
+    if len(data) != sum(lengths):
+        raise ValueError("%s is truncated" % f.name)
+    strings = []
+    offset = 0
+    for length in lengths:
+        strings.append(data[offset:offset + length].decode("utf-8", "surrogateescape"))
+        offset += length
+    return strings
+
+
+class ResultStoreWriter(object):
+    """
+     - Write the violations in the result store
+     - The target roots, file paths, rule names and messages are written
+       once, and each violation refers to them by their ids.
+     - The file paths are written relative to the root of the target set
+       by SetTarget when they are seen first.
+    """
+
+    def __init__(self, path, blockSize=BLOCK_SIZE):
+        self.file = open(path, "wb")
+        self.file.write(_HEADER.pack(MAGIC, VERSION))
+        self.blockSize = blockSize
+        self.ids = ({}, {}, {}, {})
+        self.newStrings = ([], [], [], [])
+        self.newFileTargetIds = array.array(_UINT32)
+        self.columns = tuple(array.array(_UINT32) for i in range(5))  # @UnusedVariable
+        self.root = ""
+        self.closed = False
+
+    def SetTarget(self, targetPath):
+        """
+        Set the target whose files are added next.
+        The files of a file target are relative to its directory.
+        """
+        root = targetPath if os.path.isdir(targetPath) else os.path.dirname(targetPath)
+        if root and not root.endswith(os.sep):
+            root += os.sep
+        # The ids of the roots follow the order of the targets
+        self._GetId(0, root)
+        self.root = root
+
+    def _GetId(self, table, value):
+        ids = self.ids[table]
+        id = ids.get(value)
+        if id is None:
+            id = ids[value] = len(ids)
+            self.newStrings[table].append(value)
+        return id
+
+    def _GetFileId(self, filename):
+        fileIds = self.ids[1]
+        id = fileIds.get(filename)
+        if id is None:
+            id = fileIds[filename] = len(fileIds)
+            root = self.root if filename.startswith(self.root) else ""
+            self.newStrings[1].append(filename[len(root):])
+            self.newFileTargetIds.append(self._GetId(0, root))
+        return id
+
+    def Add(self, filename, lineno, column, ruleName, message):
+        fileIds, lines, columns, ruleIds, messageIds = self.columns
+        fileIds.append(self._GetFileId(filename))
+        lines.append(lineno)
+        columns.append(column)
+        ruleIds.append(self._GetId(2, ruleName))
+        messageIds.append(self._GetId(3, message))
+        if len(lines) >= self.blockSize:
+            self.WriteBlock()
+
+    def WriteBlock(self):
+        count = len(self.columns[0])
+        if count == 0:
+            return
+        self.file.write(_BLOCK_HEADER.pack(count, *[len(strings) for strings in self.newStrings]))
+        for strings in self.newStrings:
+            _WriteStrings(self.file, strings)
+            if strings is self.newStrings[1]:
+                self.file.write(_ToBytes(self.newFileTargetIds))
+                del self.newFileTargetIds[:]
+            del strings[:]
+        for eachColumn in self.columns:
+            self.file.write(_ToBytes(eachColumn))
+            del eachColumn[:]
+
+    def close(self):
+        if not self.closed:
+            self.WriteBlock()
+            self.file.close()
+            self.closed = True
+
+
+class ResultStoreReader(object):
+    """
+     - Read the violations of the result store
+     - files, rules and messages are the strings which the ids of the
+       blocks read so far refer to.
+     - relativeFiles are the file paths relative to the roots of their
+       targets, and fileTargetIds the ids of these targets.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.roots = []
+        self.files = []
+        self.relativeFiles = []
+        self.fileTargetIds = []
+        self.rules = []
+        self.messages = []
+
+    def Blocks(self):
+        """
+        Yield the (fileIds, lines, columns, ruleIds, messageIds) columns of each block
+        """
+        tables = (self.roots, self.relativeFiles, self.rules, self.messages)
+        for eachTable in tables + (self.files, self.fileTargetIds):
+            del eachTable[:]
+        with open(self.path, "rb") as f:
+            header = f.read(_HEADER.size)
+            if len(header) != _HEADER.size or _HEADER.unpack(header) != (MAGIC, VERSION):
+                raise ValueError("%s is not a result store" % self.path)
+            while True:
+                header = f.read(_BLOCK_HEADER.size)
+                if not header:
+                    break
+                if len(header) != _BLOCK_HEADER.size:
+                    raise ValueError("%s is truncated" % self.path)
+                blockHeader = _BLOCK_HEADER.unpack(header)
+                for eachTable, count in zip(tables, blockHeader[1:]):
+                    eachTable.extend(_ReadStrings(f, count))
+                    if eachTable is self.relativeFiles:
+                        self.fileTargetIds.extend(_ReadArray(f, count))
+                for index in range(len(self.files), len(self.relativeFiles)):
+                    self.files.append(self.roots[self.fileTargetIds[index]] + self.relativeFiles[index])
+                yield tuple(_ReadArray(f, blockHeader[0]) for i in range(5))  # @UnusedVariable
+
+    def Violations(self):
+        """
+        Yield the (filename, lineno, column, ruleName, message) of the violations
+        """
+        for fileIds, lines, columns, ruleIds, messageIds in self.Blocks():
+            files, rules, messages = self.files, self.rules, self.messages
+            for fileId, lineno, column, ruleId, messageId in zip(fileIds, lines, columns, ruleIds, messageIds):
+                yield (files[fileId], lineno, column, rules[ruleId], messages[messageId])
+
+
+##########################################################################
+# Diff
+##########################################################################
+
+
+def _CountKeys(reader):
+    counts = collections.Counter()
+    for fileIds, lines, columns, ruleIds, messageIds in reader.Blocks():  # @UnusedVariable
+        counts.update(zip(fileIds, ruleIds, messageIds))
+    return counts
+
+
+def _GetIdMap(strings, otherStrings):
+    """
+    Get the ids of the strings in the other store, -1 for the ones not in it
+    """
+    otherIds = dict((eachString, id) for id, eachString in enumerate(otherStrings))
+    return [otherIds.get(eachString, -1) for eachString in strings]
+
+
+def _GetFileFingerprints(reader):
+    """
+    Get the fingerprints of the files, which are their paths relative to the
+    roots of their targets, with the targets told apart by their order.
+    """
+    return ["%d:%s" % (targetId, relativeFile.replace("\\", "/"))
+            for targetId, relativeFile in zip(reader.fileTargetIds, reader.relativeFiles)]
+
+
+def _GetExcessViolations(reader, skipCounts):
+    """
+    Get the violations of the reader whose (fileId, ruleId, messageId) keys
+    are in skipCounts, except the first skipCounts[key] ones, which are
+    taken as the ones of the other store.
+    """
+    violations = []
+    if not skipCounts:
+        return violations
+    for fileIds, lines, columns, ruleIds, messageIds in reader.Blocks():
+        keys = list(zip(fileIds, ruleIds, messageIds))
+        # Only the violations of these keys are looked at one by one
+        for index in itertools.compress(range(len(keys)), map(skipCounts.__contains__, keys)):
+            key = keys[index]
+            skipCount = skipCounts[key]
+            if skipCount:
+                skipCounts[key] = skipCount - 1
+                continue
+            fileId, ruleId, messageId = key
+            violations.append((reader.files[fileId], lines[index], columns[index],
+                               reader.rules[ruleId], reader.messages[messageId]))
+    return violations
+
+
+def DiffResultStores(oldPath, newPath):
+    """
+    Compare the result stores by the fingerprints of the violations, which
+    are their file, rule and message. The lines are not part of them, so the
+    violations which are only moved by the changes of the file are the same.
+    The files are compared by their paths relative to their targets, so the
+    stores of the checkouts in different directories can be compared.
+    Return the violations only in the new store and the ones only in the old store.
+    """
+    oldReader = ResultStoreReader(oldPath)
+    newReader = ResultStoreReader(newPath)
+    oldCounts = _CountKeys(oldReader)
+    newCounts = _CountKeys(newReader)
+
+    # Compare the keys in the ids of the new store
+    fileMap = _GetIdMap(_GetFileFingerprints(oldReader), _GetFileFingerprints(newReader))
+    ruleMap = _GetIdMap(oldReader.rules, newReader.rules)
+    messageMap = _GetIdMap(oldReader.messages, newReader.messages)
+    oldCountsInNew = {}
+    fixedSkipCounts = {}
+    for key, count in oldCounts.items():
+        newKey = (fileMap[key[0]], ruleMap[key[1]], messageMap[key[2]])
+        newCount = newCounts.get(newKey, 0)
+        if count > newCount:
+            fixedSkipCounts[key] = newCount
+        oldCountsInNew[newKey] = count
+    addedSkipCounts = dict((key, oldCountsInNew.get(key, 0)) for key, count in newCounts.items()
+                           if count > oldCountsInNew.get(key, 0))
+    return (_GetExcessViolations(newReader, addedSkipCounts),
+            _GetExcessViolations(oldReader, fixedSkipCounts))
@@ -58,6 +58,9 @@ def FindAll(pattern, s):
 def GetRealColumn(token):
     """ Get the token's real column """
     tabsize = int(nsiqcppstyle_state._nsiqcppstyle_state.GetVar("tabsize", 4))
+    navigator = getattr(token, "navigator", None)
+    if navigator is not None:
+        return navigator.GetRealColumn(token, tabsize)
 
     line = token.line[:token.column]
     tabCount = line.count("\t")
@@ -67,6 +70,9 @@ def GetRealColumn(token):
 def GetIndentation(token):
     """ Get indentation of the line in which the tokens exists"""
     tabsize = int(nsiqcppstyle_state._nsiqcppstyle_state.GetVar("tabsize", 4))
+    navigator = getattr(token, "navigator", None)
+    if navigator is not None:
+        return navigator.GetIndentation(token, tabsize)
 
     line = token.line
     indent = 0
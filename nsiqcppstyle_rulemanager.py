@@ -25,17 +25,34 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import re
+import sys
+import bisect
+import importlib
 import sre_compile
+import hashlib
 from nsiqcppstyle_outputer import _consoleOutputer as console
 from nsiqcppstyle_util import *  # @UnusedWildImport
-from typing import Callable
+from typing import Callable, Iterable, Optional
 from nsiqcppstyle_types import *
 
+# What the rules need from the file. Each level includes the lower levels.
+# Only the name of the file, which is not read.
+NEEDS_NAME = 0
+# The lines of the file, without lexing it.
+NEEDS_LINES = 1
+# The tokens of the file, which can be given window by window for huge files.
+NEEDS_TOKENS = 2
+# The context of the whole file, i.e. the contextStack, FUNCTION and TYPE tokens.
+# It's assumed for the rules which don't declare what they need.
+NEEDS_CONTEXT = 3
+
 
 class RuleManager:
     def __init__(self, runtimePath):
         self.availRuleNames = []
         basePath = os.path.join(runtimePath, "rules")
+        self.rulePath = basePath
         ruleFiles = os.listdir(basePath)
         rulePattern = sre_compile.compile(r"^(.*)\.py$")
         for eachRuleFile in ruleFiles:
@@ -48,32 +65,38 @@ class RuleManager:
         self.availRuleCount = len(self.availRuleNames)
         self.availRuleModules = {}
         self.loadedRule = []
-        self.rules = []
-        self.preprocessRules = []
+        self.loadedRuleModules = set()
+        self.loadedRuleNames = None
+        self.rules = TokenTypeRules()
+        self.preprocessRules = TokenTypeRules()
         self.commentRules = []
         self.functionNameRules = []
-        self.functionScopeRules = []
+        self.functionScopeRules = TokenTypeRules()
         self.typeNameRules = []
-        self.typeScopeRules = []
+        self.typeScopeRules = TokenTypeRules()
         self.lineRules = []
+        self.rawLineRules = []
+        self.rawLinePattern = None
         self.fileEndRules = []
         self.fileStartRules = []
+        self.sessionFileRules = []
         self.sessionEndRules = []
         self.sessionStartRules = []
         self.projectRules = []
-        self.rollBackImporter = None
+        self.unbalancedRules = set()
+        self.ruleNeeds = {}
+        self.ruleNames = {}
 #       self.LoadAllRules()
 
     def LoadRules(self, checkingRuleNames):
         """
-        Load Rules. It resets rule before loading rules
+        Load Rules. It resets rule before loading rules.
+        The rules are kept as they are when they are the same as the loaded rules.
         """
-        self.ResetRules()
-        self.ResetRegisteredRules()
-        if self.rollBackImporter is not None:
-            self.rollBackImporter.uninstall()
-
-        self.rollBackImporter = RollbackImporter()
+        reuse = self.loadedRuleNames == list(checkingRuleNames)
+        if not reuse:
+            self.ResetRules()
+            self.ResetRegisteredRules()
         console.Out.Ci(console.Separator)
 
         for ruleName in checkingRuleNames:
@@ -84,92 +107,200 @@ class RuleManager:
                 continue
             else:
                 console.Out.Info("  - ", ruleName, "is applied.")
-            ruleModule = __import__("rules." + ruleName)
-            self.loadedRule.append(ruleModule)
+            if not reuse and ruleName not in self.loadedRuleModules:
+                self.loadedRuleModules.add(ruleName)
+                self.loadedRule.append(self.RegisterRuleModule(ruleName))
+        self.loadedRuleNames = list(checkingRuleNames)
         if len(self.loadedRule) == 0:
             console.Out.Ci(
                 "  No Rule is specified. Please configure rules in filefilter.txt.")
         console.Out.Ci(console.Separator)
 
+    def RegisterRuleModule(self, ruleName):
+        """
+        Register the rules of the rule module, which is imported only once.
+        The module registers its rules in its RegisterRules(ruleManager).
+        A module without it registers its rules when it runs, so it's reloaded.
+        """
+        moduleName = "rules." + ruleName
+        ruleModule = self.availRuleModules.get(ruleName)
+        reload = ruleModule is not None or moduleName in sys.modules
+        if ruleModule is None:
+            ruleModule = importlib.import_module(moduleName)
+            self.availRuleModules[ruleName] = ruleModule
+        if hasattr(ruleModule, "RegisterRules"):
+            ruleModule.RegisterRules(self)
+        elif reload:
+            importlib.reload(ruleModule)
+        return ruleModule
+
     def ResetRules(self):
         self.loadedRule = []
+        self.loadedRuleModules = set()
+        self.loadedRuleNames = None
+
+    def GetRuleVersion(self, ruleName):
+        """
+        Get the version of the rule, which is the digest of its source.
+        """
+        try:
+            with open(os.path.join(self.rulePath, ruleName + ".py"), "rb") as f:
+                return hashlib.md5(f.read()).hexdigest()
+        except (IOError, OSError):
+            return ""
 
     ##########################################################################
     # Rule Runner
     ##########################################################################
     def RunPreprocessRule(self, lexer, contextStack):
         """ Run rules which runs in the preprecessor blocks """
-        for preprocessRule in self.preprocessRules:
-            data = lexer.Backup()
+        checkpoint = lexer.Checkpoint()
+        for preprocessRule in self.preprocessRules.Get(lexer.GetCurToken().type):
             preprocessRule(lexer, contextStack)
-            lexer.Restore(data)
+            if not lexer.RestoreCheckpoint(checkpoint):
+                self.ReportUnbalancedRule(preprocessRule)
 
     def RunCommentRule(self, lexer, token):
         """ Rule when a comment is encountered """
+        checkpoint = lexer.Checkpoint()
         for eachCommentRule in self.commentRules:
-            data = lexer.Backup()
             eachCommentRule(lexer, token)
-            lexer.Restore(data)
+            if not lexer.RestoreCheckpoint(checkpoint):
+                self.ReportUnbalancedRule(eachCommentRule)
 
     def RunFunctionNameRule(self, lexer, functionFullName,
                             decl, contextStack, functionContext):
         """ Run rules which runs on the function name """
+        checkpoint = lexer.Checkpoint()
         for eachFunctionNameRule in self.functionNameRules:
-            data = lexer.Backup()
             eachFunctionNameRule(lexer, functionFullName,
                                  decl, contextStack, functionContext)
-            lexer.Restore(data)
+            if not lexer.RestoreCheckpoint(checkpoint):
+                self.ReportUnbalancedRule(eachFunctionNameRule)
 
     def RunFunctionScopeRule(self, lexer, contextStack):
         """ Run rules which runs in the function blocks """
-        for eachFunctionScopeRule in self.functionScopeRules:
-            data = lexer.Backup()
+        checkpoint = lexer.Checkpoint()
+        for eachFunctionScopeRule in self.functionScopeRules.Get(lexer.GetCurToken().type):
             eachFunctionScopeRule(lexer, contextStack)
-            lexer.Restore(data)
+            if not lexer.RestoreCheckpoint(checkpoint):
+                self.ReportUnbalancedRule(eachFunctionScopeRule)
 
     def RunTypeNameRule(self, lexer, typeName, typeFullName,
                         decl, contextStack, typeContext):
         """ Run rules which runs on the type names """
+        checkpoint = lexer.Checkpoint()
         for typeNameRule in self.typeNameRules:
-            data = lexer.Backup()
             typeNameRule(lexer, typeName, typeFullName,
                          decl, contextStack, typeContext)
-            lexer.Restore(data)
+            if not lexer.RestoreCheckpoint(checkpoint):
+                self.ReportUnbalancedRule(typeNameRule)
 
     def RunTypeScopeRule(self, lexer, contextStack):
         """ Run rules which runs in the type blocks """
-        for typeScopeRule in self.typeScopeRules:
-            data = lexer.Backup()
+        checkpoint = lexer.Checkpoint()
+        for typeScopeRule in self.typeScopeRules.Get(lexer.GetCurToken().type):
             typeScopeRule(lexer, contextStack)
-            lexer.Restore(data)
+            if not lexer.RestoreCheckpoint(checkpoint):
+                self.ReportUnbalancedRule(typeScopeRule)
 
     def RunRule(self, lexer, contextStack):
         """ Run rules which runs in any tokens """
-        for rule in self.rules:
-            data = lexer.Backup()
+        checkpoint = lexer.Checkpoint()
+        for rule in self.rules.Get(lexer.GetCurToken().type):
             rule(lexer, contextStack)
-            lexer.Restore(data)
+            if not lexer.RestoreCheckpoint(checkpoint):
+                self.ReportUnbalancedRule(rule)
 
     def RunLineRule(self, lexer, line, lineno):
-        """ Run rules which runs in each lines. """
+        """
+        Run rules which runs in each lines.
+        The rules suppressed on the line are not run, as they report on the line.
+        """
+        checkpoint = lexer.Checkpoint()
         for lineRule in self.lineRules:
-            data = lexer.Backup()
+            if lexer.IsSuppressed(lineno, self.ruleNames[lineRule]):
+                continue
             lineRule(lexer, line, lineno)
-            lexer.Restore(data)
+            if not lexer.RestoreCheckpoint(checkpoint):
+                self.ReportUnbalancedRule(lineRule)
+
+    def RunRawLineRule(self, lexer, start=0, end=None):
+        """
+        Run rules which runs in every line of the file, including the empty
+        lines and the lines in comments. The lines from start to end, which
+        are the indexes of lexer.lines, are checked. The lines are found by
+        one search of the patterns of the rules, combined, on the data.
+        """
+        if not self.rawLineRules:
+            return
+        lines = lexer.lines
+        if end is None:
+            end = len(lines)
+        if any(pattern is None for rule, pattern in self.rawLineRules):
+            candidates = range(start, end)
+        else:
+            candidates = self._FindRawLines(lexer, start, end)
+        checkpoint = lexer.Checkpoint()
+        for index in candidates:
+            line = lines[index]
+            lineno = lexer.lineOffset + index + 1
+            for rawLineRule, pattern in self.rawLineRules:
+                if (pattern is None or pattern.search(line)) and \
+                        not lexer.IsSuppressed(lineno, self.ruleNames[rawLineRule]):
+                    rawLineRule(lexer, line, lineno)
+                    if not lexer.RestoreCheckpoint(checkpoint):
+                        self.ReportUnbalancedRule(rawLineRule)
+
+    def _FindRawLines(self, lexer, start, end):
+        """
+        Find the lines where any pattern of the raw line rules may match.
+        The lines are checked with the pattern of each rule afterwards, as a
+        match of the combined pattern can run over the end of the line.
+        """
+        if self.rawLinePattern is None:
+            self.rawLinePattern = re.compile(
+                "|".join("(?:%s)" % pattern.pattern for rule, pattern in self.rawLineRules),
+                re.MULTILINE)
+        lineStarts = lexer.lineStarts
+        pos = lineStarts[start]
+        endpos = lineStarts[end] if end < len(lineStarts) else len(lexer.data)
+        while True:
+            match = self.rawLinePattern.search(lexer.data, pos, endpos)
+            if match is None:
+                break
+            index = bisect.bisect_right(lineStarts, match.start()) - 1
+            if index >= end:
+                break
+            yield index
+            if index + 1 >= len(lineStarts):
+                break
+            pos = lineStarts[index + 1]
 
     def RunFileEndRule(self, lexer, filename, dirname):
         """ Run rules which runs at the end of files. """
+        checkpoint = lexer.Checkpoint()
         for fileEndRule in self.fileEndRules:
-            data = lexer.Backup()
             fileEndRule(lexer, filename, dirname)
-            lexer.Restore(data)
+            if not lexer.RestoreCheckpoint(checkpoint):
+                self.ReportUnbalancedRule(fileEndRule)
 
     def RunFileStartRule(self, lexer, filename, dirname):
         """ Run rules which runs at the start of files. """
+        checkpoint = lexer.Checkpoint()
         for fileStartRule in self.fileStartRules:
-            data = lexer.Backup()
             fileStartRule(lexer, filename, dirname)
-            lexer.Restore(data)
+            if not lexer.RestoreCheckpoint(checkpoint):
+                self.ReportUnbalancedRule(fileStartRule)
+
+    def RunSessionFileRule(self, filename, dirname):
+        """
+        Run rules which keep state across the files of the session.
+        These rules run in the main process in the order of the files,
+        when the results of each file are merged.
+        """
+        for sessionFileRule in self.sessionFileRules:
+            sessionFileRule(filename, dirname)
 
     def RunSessionEndRules(self):
         """ Run rules which runs at the end of the script session. """
@@ -186,6 +317,40 @@ class RuleManager:
         for projectRule in self.projectRules:
             projectRule(targetName)
 
+    def GetNeeds(self):
+        """ Get what the registered rules need from the file at most. """
+        return max(self.ruleNeeds.values(), default=NEEDS_NAME)
+
+    def NeedsLines(self):
+        """ Check if any registered rule reads the file. """
+        return self.GetNeeds() >= NEEDS_LINES
+
+    def NeedsTokens(self):
+        """ Check if any registered rule runs on the tokens of the file. """
+        return self.GetNeeds() >= NEEDS_TOKENS
+
+    def NeedsContext(self):
+        """ Check if any registered rule needs the context of the file. """
+        return self.GetNeeds() >= NEEDS_CONTEXT
+
+    def GetWholeFileRules(self):
+        """
+        Get the names of the registered rules which need more than the tokens,
+        so that a file can't be checked window by window for them.
+        """
+        return sorted(set(getattr(rule, "__module__", str(rule)).split(".")[-1]
+                          for rule, needs in self.ruleNeeds.items() if needs > NEEDS_TOKENS))
+
+    def ReportUnbalancedRule(self, rule):
+        """
+        Report a rule which did not pop all the token indexes it pushed.
+        The token index stack is restored anyway, it's reported once per rule.
+        """
+        if rule not in self.unbalancedRules:
+            self.unbalancedRules.add(rule)
+            console.Err.Verbose("Rule Error : %s leaves the token index stack unbalanced"
+                                % getattr(rule, "__module__", rule))
+
     ##########################################################################
     # Rule Resister Methods
     ##########################################################################
@@ -193,31 +358,54 @@ class RuleManager:
     def ResetRegisteredRules(self):
         """ Reset all registered rules. """
 
+        self.loadedRuleNames = None
+        self.unbalancedRules.clear()
+        self.ruleNeeds.clear()
+        self.ruleNames.clear()
         self.functionNameRules.clear()
         self.functionScopeRules.clear()
         self.lineRules.clear()
+        self.rawLineRules.clear()
+        self.rawLinePattern = None
         self.rules.clear()
         self.typeNameRules.clear()
         self.typeScopeRules.clear()
         self.fileStartRules.clear()
         self.fileEndRules.clear()
+        self.sessionFileRules.clear()
         self.sessionStartRules.clear()
         self.sessionEndRules.clear()
         self.projectRules.clear()
         self.preprocessRules.clear()
         self.commentRules.clear()
 
-    def AddPreprocessRule(self, user_function: Callable[[Lexer, ContextStack], None]):
-        """ Add rule which runs in preprocess statements """
-        self.preprocessRules.append(user_function)
+    def AddPreprocessRule(self, user_function: Callable[[Lexer, ContextStack], None],
+                          tokenTypes: Optional[Iterable[str]] = None,
+                          needs: int = NEEDS_CONTEXT):
+        """
+        Add rule which runs in preprocess statements
 
-    def AddCommentRule(self, user_function: Callable[[Lexer, Token], None]):
+        If tokenTypes is given, the rule only runs on the tokens of these types.
+        needs is what the rule uses from the file, e.g. NEEDS_TOKENS.
+        """
+        self.preprocessRules.Add(user_function, tokenTypes)
+        self._AddNeeds(user_function, needs)
+
+    def AddCommentRule(self, user_function: Callable[[Lexer, Token], None],
+                       needs: int = NEEDS_CONTEXT):
         """ Add rule which runs when a comment is encountered """
         self.commentRules.append(user_function)
+        self._AddNeeds(user_function, needs)
+
+    def AddFunctionScopeRule(self, user_function: Callable[[Lexer, ContextStack], None],
+                             tokenTypes: Optional[Iterable[str]] = None):
+        """
+        Add rule which runs in function scope
 
-    def AddFunctionScopeRule(self, user_function: Callable[[Lexer, ContextStack], None]):
-        """ Add rule which runs in function scope """
-        self.functionScopeRules.append(user_function)
+        If tokenTypes is given, the rule only runs on the tokens of these types.
+        """
+        self.functionScopeRules.Add(user_function, tokenTypes)
+        self._AddNeeds(user_function, NEEDS_CONTEXT)
 
     def AddFunctionNameRule(self,
                             user_function: Callable[
@@ -225,14 +413,46 @@ class RuleManager:
                                 None]):
         """ Add rule on the function name place """
         self.functionNameRules.append(user_function)
+        self._AddNeeds(user_function, NEEDS_CONTEXT)
 
-    def AddLineRule(self, user_function: Callable[[Lexer, LineText, LineNumber], None]):
+    def AddLineRule(self, user_function: Callable[[Lexer, LineText, LineNumber], None],
+                    needs: int = NEEDS_CONTEXT):
         """ Add rule on the each line """
         self.lineRules.append(user_function)
+        self._AddNeeds(user_function, needs)
 
-    def AddRule(self, user_function: Callable[[Lexer, ContextStack], None]):
-        """ Add rule on any token """
-        self.rules.append(user_function)
+    def AddRawLineRule(self, user_function: Callable[[Lexer, LineText, LineNumber], None],
+                       pattern: Optional[str] = None, needs: int = NEEDS_LINES):
+        """
+        Add rule on every line of the file, before the rules on the tokens
+
+        Unlike AddLineRule, the rule also runs on the empty lines, the lines in
+        comments and the lines in the inactive #if blocks, and the file is not
+        lexed when only these rules are registered.
+        If pattern is given, the rule only runs on the lines where the regular
+        expression is found, e.g. ruleManager.AddRawLineRule(RunRule, r"^.{121}")
+        A rule which skips the lines without tokens with lexer.IsTokenLine, as
+        AddLineRule does, should give NEEDS_TOKENS.
+        """
+        if pattern is not None:
+            pattern = re.compile(pattern)
+        self.rawLineRules.append((user_function, pattern))
+        self.rawLinePattern = None
+        self._AddNeeds(user_function, needs)
+
+    def AddRule(self, user_function: Callable[[Lexer, ContextStack], None],
+                tokenTypes: Optional[Iterable[str]] = None,
+                needs: int = NEEDS_CONTEXT):
+        """
+        Add rule on any token
+
+        If tokenTypes is given, the rule only runs on the tokens of these types,
+        e.g. ruleManager.AddRule(RunRule, ["IF", "WHILE"])
+        needs is what the rule uses from the file. A rule which doesn't look at
+        the context should give NEEDS_TOKENS, so that huge files can be streamed.
+        """
+        self.rules.Add(user_function, tokenTypes)
+        self._AddNeeds(user_function, needs)
 
     def AddTypeNameRule(self, user_function: Callable[
                                 [Lexer, TypeName, TypeFullName,
@@ -240,18 +460,40 @@ class RuleManager:
                                 None]):
         """ Add rule on any type (class / struct / union / namespace / enum) """
         self.typeNameRules.append(user_function)
+        self._AddNeeds(user_function, NEEDS_CONTEXT)
 
-    def AddTypeScopeRule(self, user_function: Callable[[Lexer, ContextStack], None]):
-        """ Add rule when the token is within a type definition scope """
-        self.typeScopeRules.append(user_function)
+    def AddTypeScopeRule(self, user_function: Callable[[Lexer, ContextStack], None],
+                         tokenTypes: Optional[Iterable[str]] = None):
+        """
+        Add rule when the token is within a type definition scope
+
+        If tokenTypes is given, the rule only runs on the tokens of these types.
+        """
+        self.typeScopeRules.Add(user_function, tokenTypes)
+        self._AddNeeds(user_function, NEEDS_CONTEXT)
 
-    def AddFileEndRule(self, user_function: Callable[[Lexer, FileName, DirName], None]):
+    def AddFileEndRule(self, user_function: Callable[[Lexer, FileName, DirName], None],
+                       needs: int = NEEDS_CONTEXT):
         """ Add rule on the file end """
         self.fileEndRules.append(user_function)
+        self._AddNeeds(user_function, needs)
 
-    def AddFileStartRule(self, user_function: Callable[[Lexer, FileName, DirName], None]):
+    def AddFileStartRule(self, user_function: Callable[[Lexer, FileName, DirName], None],
+                         needs: int = NEEDS_CONTEXT):
         """ Add rule on the file start """
         self.fileStartRules.append(user_function)
+        self._AddNeeds(user_function, needs)
+
+    def AddSessionFileRule(self, user_function: Callable[[FileName, DirName], None]):
+        """
+        Add rule on each file, which keeps state across the files of the session.
+
+        Rules which only look at the file name but remember the files seen so far
+        should use this instead of AddFileStartRule. They are called in the main
+        process in the order of the files, even when the files are checked by
+        several worker processes.
+        """
+        self.sessionFileRules.append(user_function)
 
     def AddSessionEndRule(self, user_function: Callable[[], None]):
         """
@@ -275,28 +517,43 @@ class RuleManager:
         """ Add rule on the project """
         self.projectRules.append(user_function)
 
+    def _AddNeeds(self, user_function, needs):
+        self.ruleNames[user_function] = getattr(user_function, "__module__", str(user_function)).split(".")[-1]
+        self.ruleNeeds[user_function] = max(needs, self.ruleNeeds.get(user_function, needs))
+
+
+class TokenTypeRules:
+    """
+    Token rules which can subscribe to the token types they want.
+
+    The rules to run for a token type are collected on the first token
+    of that type and kept in a table, in the order of the registration.
+    """
 
-class RollbackImporter:
     def __init__(self):
-        """Creates an instance and installs as the global importer"""
-        self.previousModules = sys.modules.copy()
-        self.realImport = __builtins__["__import__"]
-        __builtins__["__import__"] = self._import
-        self.newModules = {}
-
-    def _import(self, name, *args, **kwargs):
-        result = self.realImport(name, *args, **kwargs)
-        if name.find("rules") != -1:
-            self.newModules[name] = 1
-        return result
-
-    def uninstall(self):
-        for modname in self.newModules.keys():
-            if modname.find("rules") != -1:
-                if modname not in self.previousModules:
-                    # Force reload when modname next imported
-                    del(sys.modules[modname])
-        __builtins__["__import__"] = self.realImport
+        self.rules = []
+        self.table = {}
+
+    def Add(self, user_function, tokenTypes=None):
+        if tokenTypes is not None:
+            tokenTypes = frozenset(tokenTypes)
+        self.rules.append((user_function, tokenTypes))
+        self.table.clear()
+
+    def Get(self, tokenType):
+        rules = self.table.get(tokenType)
+        if rules is None:
+            rules = [rule for rule, tokenTypes in self.rules
+                     if tokenTypes is None or tokenType in tokenTypes]
+            self.table[tokenType] = rules
+        return rules
+
+    def clear(self):
+        self.rules.clear()
+        self.table.clear()
+
+    def __len__(self):
+        return len(self.rules)
 
 
 ruleManager = RuleManager(GetRuntimePath())
@@ -43,6 +43,11 @@ class _NsiqCppStyleState(object):
         self.reportError = False
         self.suppressRules = {}
         self.varMap = {}
+        # files over streamSize bytes are checked window by window when the
+        # rules allow it, files over maxFileSize bytes are not checked otherwise.
+        # 0 turns them off.
+        self.streamSize = 16 * 1024 * 1024
+        self.maxFileSize = 256 * 1024 * 1024
 
     def SetOutputFormat(self, output_format):
         """Sets the output format for errors."""
@@ -75,6 +80,12 @@ class _NsiqCppStyleState(object):
     def CheckRuleSuppression(self, ruleName):
         return self.suppressRules.get(ruleName, False)
 
+    def GetSuppressedRules(self):
+        return list(self.suppressRules.keys())
+
+    def SetSuppressedRules(self, ruleNames):
+        self.suppressRules = dict((ruleName, True) for ruleName in ruleNames)
+
     def GetVar(self, key, defaultValue):
         return self.varMap.get(key, defaultValue)
 
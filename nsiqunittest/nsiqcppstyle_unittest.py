@@ -25,10 +25,23 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import csv
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
 import unittest
 import nsiqcppstyle_checker
+import nsiqcppstyle_cache
+import nsiqcppstyle_exe
+import nsiqcppstyle_rulemanager
 from nsiqcppstyle_outputer import _consoleOutputer as console
 import nsiqcppstyle_state
+import nsiqcppstyle_reporter
+import nsiqcppstyle_resultstore
 
 
 class unitTest(unittest.TestCase):
@@ -189,3 +202,751 @@ foo (bar*)[];
         navigator.Reset()
         tok = navigator.GetNextTokenSkipWhiteSpaceAndComment()
         assert(tok.type == 'ID' and tok.value == 'foo')
+
+    def testLexTab(self):
+        data = "int main() {\n    return 0; // comment\n}\n"
+        expected = [(tok.type, tok.value, tok.lineno, tok.column)
+                    for tok in nsiqcppstyle_checker.CppLexerNavigator("a.cpp", data).tokenlist]
+        tabdir = tempfile.mkdtemp()
+        try:
+            # First build writes the table, second build loads it
+            for x in range(2):  # @UnusedVariable
+                nsiqcppstyle_checker.EnableLexTab(tabdir)
+                navigator = nsiqcppstyle_checker.CppLexerNavigator("a.cpp", data)
+                assert([(tok.type, tok.value, tok.lineno, tok.column)
+                        for tok in navigator.tokenlist] == expected)
+                tabs = [f for f in os.listdir(tabdir) if f.endswith(".py")]
+                assert(tabs == [nsiqcppstyle_checker._GetLexTabName() + ".py"])
+            assert(nsiqcppstyle_checker._lexerTemplate.lexoptimize)
+        finally:
+            nsiqcppstyle_checker.EnableLexTab(None)
+            shutil.rmtree(tabdir)
+
+    def testResultCache(self):
+        cacheDir = tempfile.mkdtemp()
+        try:
+            cache = nsiqcppstyle_cache.ResultCache(cacheDir, "config")
+            source = os.path.join(cacheDir, "a.cpp")
+            with open(source, "w") as f:
+                f.write("int a;")
+            key = cache.GetKey(source)
+            assert(cache.Get(key, source) is None)
+            cache.Put(key, [(source, 1, 2, "RULE_A", "message")], ["RULE_B"])
+            assert(cache.Get(key, source) == ([(source, 1, 2, "RULE_A", "message")], ["RULE_B"]))
+            # The same size but a different content
+            with open(source, "w") as f:
+                f.write("int b;")
+            assert(cache.GetKey(source) != key)
+            assert(nsiqcppstyle_cache.ResultCache(cacheDir, "config2").GetKey(source) != cache.GetKey(source))
+        finally:
+            shutil.rmtree(cacheDir)
+
+    def testTokenTypeRules(self):
+        rules = nsiqcppstyle_rulemanager.TokenTypeRules()
+
+        def anyRule():
+            pass
+
+        def braceRule():
+            pass
+        rules.Add(braceRule, ["LBRACE", "RBRACE"])
+        rules.Add(anyRule)
+        assert(rules.Get("LBRACE") == [braceRule, anyRule])
+        assert(rules.Get("ID") == [anyRule])
+        # Adding a rule invalidates the table
+        rules.Add(braceRule, ("ID",))
+        assert(rules.Get("ID") == [anyRule, braceRule])
+        rules.clear()
+        assert(rules.Get("ID") == [])
+
+    def testHasBody(self):
+        lexer = nsiqcppstyle_checker.CppLexerNavigator(
+            "a.cpp", "void a();\n#define B {\nvoid c() {\n}\n#if 0\n;\n#endif\n")
+        assert(lexer.GetNextTokenInType("ID", True).value == "a")
+        lexer.GetNextTokenInType("ID")
+        assert(not lexer.HasBody())
+        assert(lexer.GetNextTokenInType("SEMI", True).lineno == 1)
+        # B in the directive is skipped
+        lexer.GetNextTokenInType("ID")
+        assert(lexer.GetCurToken().value == "c")
+        assert(lexer.HasBody())
+        # The braces in the directives and the inactive blocks are skipped
+        assert(lexer.GetNextTokenInType("LBRACE").lineno == 3)
+        assert(lexer.GetNextTokenInType("SEMI") is None)
+        assert(lexer.GetCurToken() == lexer.tokenlist[-1])
+
+    def testMatchingTable(self):
+        lexer = nsiqcppstyle_checker.CppLexerNavigator(
+            "a.cpp", "a<b<c>> d; f(x[1], {2});")
+        tokens = dict((t.value, t) for t in lexer.tokenlist if t.type != "SPACE")
+        lexer._MoveToToken(tokens[">>"])
+        assert(lexer.GetPrevMatchingLT(True) is lexer.tokenlist[1])
+        lexer._MoveToToken(lexer.tokenlist[1])
+        assert(lexer.GetNextMatchingGT() is tokens[">>"])
+        lexer._MoveToToken(tokens["("])
+        assert(lexer.GetNextMatchingToken(True) is tokens[")"])
+        lexer._MoveToToken(tokens["}"])
+        assert(lexer.GetPrevMatchingToken() is tokens["{"])
+        assert(lexer.GetCurToken() is tokens["{"])
+
+    def testMatchingTableUnbalanced(self):
+        lexer = nsiqcppstyle_checker.CppLexerNavigator("a.cpp", "{ ( ] ) { ( ) x")
+        tokens = [t for t in lexer.tokenlist if t.type != "SPACE"]
+        # ] does not match ( and stops the search
+        lexer._MoveToToken(tokens[0])
+        assert(lexer.GetNextMatchingToken() is None)
+        assert(lexer.GetCurToken() is tokens[2])
+        # The unclosed { takes the last closed )
+        lexer._MoveToToken(tokens[4])
+        assert(lexer.GetNextMatchingToken(True) is tokens[6])
+        lexer._MoveToToken(tokens[5])
+        assert(lexer.GetNextMatchingToken(True) is None)
+        lexer._MoveToToken(tokens[6])
+        assert(lexer.GetPrevMatchingToken(True) is tokens[4])
+
+    def testPeekSkipWhiteSpaceAndCommentAndPreprocess(self):
+        lexer = nsiqcppstyle_checker.CppLexerNavigator(
+            "a.cpp", "a /* c */ b\n#define X \\\n  y\nc // d\n#if 0\ne\n#endif\nf")
+        values = ["a", "b", "c", "f"]
+        lexer.Reset()
+        for offset in range(1, 5):
+            assert(lexer.PeekNextTokenSkipWhiteSpaceAndCommentAndPreprocess(offset).value == values[offset - 1])
+        assert(lexer.PeekNextTokenSkipWhiteSpaceAndCommentAndPreprocess(5) is None)
+        assert(lexer.tokenindex == -1)
+        lexer._MoveToToken(lexer.tokenlist[-1])
+        assert(lexer.PeekPrevTokenSkipWhiteSpaceAndCommentAndPreprocess(1).value == "c")
+        # Going backward, only the lines starting with # are skipped
+        assert(lexer.PeekPrevTokenSkipWhiteSpaceAndCommentAndPreprocess(2).value == "y")
+        assert(lexer.GetPrevTokenSkipWhiteSpaceAndCommentAndPreprocess().value == "c")
+        assert(lexer.GetNextTokenSkipWhiteSpaceAndCommentAndPreprocess().value == "f")
+        assert(lexer.GetNextTokenSkipWhiteSpaceAndCommentAndPreprocess() is None)
+        assert(lexer.GetCurToken() is lexer.tokenlist[-1])
+
+    def testContextStack(self):
+        Context = nsiqcppstyle_checker.Context
+        stack = nsiqcppstyle_checker.ContextStack()
+        assert(stack.IsEmpty() and stack.Peek() is None and stack.SigPeek() is None)
+        stack.Push(Context("CLASS_BLOCK", "A", True))
+        copy = stack.Copy()
+        copy.Push(Context("PARENBLOCK", ""))
+        # Pushing on the copy does not change the original stack
+        assert(stack.Size() == 1 and copy.Size() == 2)
+        assert(copy.Peek().type == "PARENBLOCK")
+        assert(copy.SigPeek().type == "CLASS_BLOCK")
+        assert(copy.ContainsIn("CLASS_BLOCK") and not copy.ContainsIn("FUNCTION_BLOCK"))
+        assert(not stack.ContainsIn("PARENBLOCK"))
+        assert([c.type for c in copy.contextstack] == ["CLASS_BLOCK", "PARENBLOCK"])
+        assert(copy.Pop().type == "PARENBLOCK" and copy.Peek() is stack.Peek())
+
+    def testInactiveBranches(self):
+        lexer = nsiqcppstyle_checker.CppLexerNavigator("a.cpp", """#if 0
+a
+#else
+b
+#endif
+#if 1
+c
+#elif X
+d
+#else
+e
+#endif
+#ifdef X
+#if 0
+f
+#elif 1
+g
+#else
+h
+#endif
+#else
+i
+#endif
+""")
+        active = [t.value for t in lexer.tokenlist if t.type == "ID" and not t.inactive]
+        assert(active == ["b", "c", "X", "g", "i"])
+        inactive = [t.lineno for t in lexer.tokenlist if t.inactive and t.type != "LINEFEED"]
+        assert(inactive == [1, 1, 1, 2, 8, 8, 8, 9, 10, 11, 14, 14, 14, 15, 18, 19])
+        assert(all(lexer.tokenlist[first].inactive and lexer.tokenlist[last].inactive
+                   for first, last in lexer.inactiveRanges))
+        assert(sum(last - first + 1 for first, last in lexer.inactiveRanges) ==
+               len([t for t in lexer.tokenlist if t.inactive]))
+
+    def testColumns(self):
+        lexer = nsiqcppstyle_checker.CppLexerNavigator("a.cpp", "int a;\n\t  b\t= 1;\n")
+        tokens = dict((t.value, t) for t in lexer.tokenlist)
+        assert((tokens["int"].column, tokens["a"].column) == (1, 5))
+        assert((tokens["b"].column, tokens["="].column, tokens["1"].column) == (4, 6, 8))
+        assert(lexer.GetRealColumn(tokens["b"], 4) == 7)
+        assert(lexer.GetRealColumn(tokens["="], 8) == 20)
+        assert(lexer.GetIndentation(tokens["="], 4) == 6)
+        assert(lexer.GetIndentation(tokens["a"], 4) == 0)
+
+    def testCheckpoint(self):
+        lexer = nsiqcppstyle_checker.CppLexerNavigator("a.cpp", "int a;")
+        lexer.GetNextTokenSkipWhiteSpace()
+        checkpoint = lexer.Checkpoint()
+        lexer.PushTokenIndex()
+        lexer.GetNextTokenSkipWhiteSpace()
+        lexer.PopTokenIndex()
+        lexer.GetNextTokenSkipWhiteSpace()
+        assert(lexer.RestoreCheckpoint(checkpoint))
+        assert(lexer.GetCurToken().value == "int")
+        # A push without pop is detected and the stack is truncated
+        lexer.PushTokenIndex()
+        lexer.GetNextTokenSkipWhiteSpace()
+        assert(not lexer.RestoreCheckpoint(checkpoint))
+        assert(lexer.GetCurToken().value == "int" and lexer.indexstack == [])
+        # A pop below the checkpoint is detected and the stack is restored
+        lexer.PushTokenIndex()
+        checkpoint = lexer.Checkpoint()
+        lexer.PopTokenIndex()
+        lexer.GetNextTokenSkipWhiteSpace()
+        assert(not lexer.RestoreCheckpoint(checkpoint))
+        assert(lexer.GetCurToken().value == "int" and len(lexer.indexstack) == 1)
+        assert(lexer.RestoreCheckpoint(checkpoint))
+
+    def testStreamFile(self):
+        ruleManager = nsiqcppstyle_rulemanager.ruleManager
+        ruleManager.ResetRegisteredRules()
+        seen = []
+
+        def tokenRule(lexer, contextStack):
+            t = lexer.GetCurToken()
+            nextToken = lexer.PeekNextToken()
+            seen.append((t.lineno, t.column, t.value, t.inactive, nextToken and nextToken.value))
+
+        def lineRule(lexer, line, lineno):
+            seen.append((lineno, line))
+        ruleManager.AddRule(tokenRule, needs=nsiqcppstyle_rulemanager.NEEDS_TOKENS)
+        ruleManager.AddPreprocessRule(tokenRule, needs=nsiqcppstyle_rulemanager.NEEDS_TOKENS)
+        ruleManager.AddLineRule(lineRule, needs=nsiqcppstyle_rulemanager.NEEDS_TOKENS)
+        assert(ruleManager.GetWholeFileRules() == [])
+        data = "int a;\n/* a\n\n\n\n comment */\n#if 0\nb;\n#define C \\\n  c\nd;\n#endif\n" \
+               "\"a\nstring\";\n#if 0\n" + "e = f;\n" * 20 + "#else\nh;\n#endif\n"
+        tmpDir = tempfile.mkdtemp()
+        consoleLevel = console.GetLevel()
+        # The windows cut in the string show illegal characters in the verbose mode
+        console.SetLevel(console.Level.Error)
+        try:
+            source = os.path.join(tmpDir, "a.cpp")
+            with open(source, "w") as f:
+                f.write(data)
+            nsiqcppstyle_checker.ProcessFile(ruleManager, source)
+            expected = seen[:]
+            # The comment is longer than the margins
+            for windowSize in (1, 10, 40):
+                for marginLines in (0, 2):
+                    del seen[:]
+                    nsiqcppstyle_checker.StreamFile(ruleManager, source, windowSize, marginLines)
+                    assert(seen == expected)
+            self.assertRaises(ValueError, nsiqcppstyle_checker.StreamFile, ruleManager, source, 10, -1)
+            # The file is not checked when it's too large for a rule needing the context
+            ruleManager.AddRule(tokenRule)
+            assert(ruleManager.GetWholeFileRules() == ["nsiqcppstyle_unittest"])
+            state = nsiqcppstyle_state._nsiqcppstyle_state
+            state.maxFileSize, maxFileSize = 10, state.maxFileSize
+            del seen[:]
+            try:
+                nsiqcppstyle_checker.ProcessFile(ruleManager, source)
+            finally:
+                state.maxFileSize = maxFileSize
+            assert(seen == [])
+        finally:
+            console.SetLevel(consoleLevel)
+            ruleManager.ResetRegisteredRules()
+            shutil.rmtree(tmpDir)
+
+    def testStreamLines(self):
+        ruleManager = nsiqcppstyle_rulemanager.ruleManager
+        ruleManager.ResetRegisteredRules()
+        state = nsiqcppstyle_state._nsiqcppstyle_state
+        streamSize, maxFileSize = state.streamSize, state.maxFileSize
+        seen = []
+
+        def lineRule(lexer, line, lineno):
+            seen.append((lineno, line, lexer.tokenlistsize))
+        tmpDir = tempfile.mkdtemp()
+        try:
+            ruleManager.AddRawLineRule(lineRule)
+            assert(ruleManager.GetNeeds() == nsiqcppstyle_rulemanager.NEEDS_LINES)
+            source = os.path.join(tmpDir, "a.cpp")
+            with open(source, "w") as f:
+                f.write("/* --RULE_A\n" + "  comment\n" * 5 + "*/\n" + "int a;\n" * 30)
+            nsiqcppstyle_checker.ProcessFile(ruleManager, source)
+            expected = seen[:]
+            assert(len(expected) == 38 and all(each[2] == 0 for each in expected))
+            # The windows are not lexed, and the first one has the whole first comment
+            for windowSize in (1, 10, 40):
+                for marginLines in (0, 2):
+                    del seen[:]
+                    state.ResetRuleSuppression()
+                    nsiqcppstyle_checker.StreamFile(ruleManager, source, windowSize, marginLines)
+                    assert(seen == expected)
+                    assert(state.CheckRuleSuppression("RULE_A"))
+            # The file over the max file size is streamed, not refused
+            state.streamSize, state.maxFileSize = 10, 10
+            del seen[:]
+            nsiqcppstyle_checker.ProcessFile(ruleManager, source)
+            assert(seen == expected)
+        finally:
+            state.streamSize, state.maxFileSize = streamSize, maxFileSize
+            state.ResetRuleSuppression()
+            ruleManager.ResetRegisteredRules()
+            shutil.rmtree(tmpDir)
+
+    def testSessionFileRuleSuppression(self):
+        targetDir = tempfile.mkdtemp()
+        try:
+            for eachDir in ("a", "b", "c"):
+                os.mkdir(os.path.join(targetDir, eachDir))
+                with open(os.path.join(targetDir, eachDir, "x.cpp"), "w") as f:
+                    if eachDir == "b":
+                        f.write("// --RULE_3_2_B_do_not_use_same_filename_more_than_once\n")
+                    f.write("int a;\n")
+            files = [os.path.join(root, eachFile) for root, dirs, fileNames in os.walk(targetDir)
+                     for eachFile in fileNames]  # @UnusedVariable
+            # The file suppressing the rule is not reported, but the others are
+            expected = [eachFile for eachFile in files[1:]
+                        if eachFile != os.path.join(targetDir, "b", "x.cpp")]
+            runtimePath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            for jobs in ("1", "2"):
+                # The exit status is the number of the violations
+                output = subprocess.run(
+                    [sys.executable, os.path.join(runtimePath, "nsiqcppstyle.py"), "-j", jobs,
+                     "--output=emacs", "--filter-string=~ RULE_3_2_B_do_not_use_same_filename_more_than_once",
+                     targetDir], stdout=subprocess.PIPE, universal_newlines=True).stdout
+                reported = [line.split(":")[0] for line in output.splitlines()
+                            if "RULE_3_2_B" in line and line.startswith(targetDir)]
+                self.assertEqual(reported, expected, "-j " + jobs)
+        finally:
+            shutil.rmtree(targetDir)
+
+    def testRawLineRule(self):
+        ruleManager = nsiqcppstyle_rulemanager.ruleManager
+        ruleManager.ResetRegisteredRules()
+        seen = []
+
+        def allLines(lexer, line, lineno):
+            seen.append(("all", lineno, line))
+
+        def longLines(lexer, line, lineno):
+            seen.append(("long", lineno, line))
+
+        def spaceLines(lexer, line, lineno):
+            seen.append(("space", lineno, line))
+        try:
+            data = "int a;\n/*\n  long comment\n*/\n\n  b;\nlong c;\n"
+            ruleManager.AddRawLineRule(longLines, r"long.*$")
+            ruleManager.AddRawLineRule(spaceLines, r"^ +\S")
+            assert(ruleManager.GetNeeds() == nsiqcppstyle_rulemanager.NEEDS_LINES)
+            nsiqcppstyle_checker.ProcessFile(ruleManager, "a.cpp", data)
+            assert(seen == [("long", 3, "  long comment"), ("space", 3, "  long comment"),
+                            ("space", 6, "  b;"), ("long", 7, "long c;")])
+            del seen[:]
+            ruleManager.AddRawLineRule(allLines)
+            nsiqcppstyle_checker.ProcessFile(ruleManager, "a.cpp", data)
+            assert([each[1] for each in seen if each[0] == "all"] == list(range(1, 9)))
+            assert(len(seen) == 12)
+            # The lines are the same when the file is streamed
+            expected = seen[:]
+            tmpDir = tempfile.mkdtemp()
+            try:
+                source = os.path.join(tmpDir, "a.cpp")
+                with open(source, "w") as f:
+                    f.write(data)
+                for windowSize in (1, 10, 40):
+                    del seen[:]
+                    nsiqcppstyle_checker.StreamFile(ruleManager, source, windowSize, 2)
+                    assert(seen == expected)
+            finally:
+                shutil.rmtree(tmpDir)
+        finally:
+            ruleManager.ResetRegisteredRules()
+
+    def testNameOnlyRules(self):
+        ruleManager = nsiqcppstyle_rulemanager.ruleManager
+        ruleManager.ResetRegisteredRules()
+        seen = []
+
+        def nameRule(lexer, filename, dirname):
+            seen.append((filename, lexer.tokenlistsize))
+        try:
+            ruleManager.AddFileStartRule(nameRule, needs=nsiqcppstyle_rulemanager.NEEDS_NAME)
+            assert(not ruleManager.NeedsLines())
+            data = "#include <a.h> // --RULE_A\nint a; /* --RULE_B */\n"
+            nsiqcppstyle_checker.ProcessFile(ruleManager, "dir/a.cpp", data)
+            # The file is not lexed, but the rules are still suppressed in its first comment
+            assert(seen == [("a.cpp", 0)])
+            state = nsiqcppstyle_state._nsiqcppstyle_state
+            assert(state.CheckRuleSuppression("RULE_A"))
+            assert(not state.CheckRuleSuppression("RULE_B"))
+            # Only the file until the first comment is read, whatever its size is
+            tmpDir = tempfile.mkdtemp()
+            maxFileSize = state.maxFileSize
+            try:
+                source = os.path.join(tmpDir, "b.cpp")
+                with open(source, "w") as f:
+                    f.write(data + "int b;\n" * 1000)
+                state.maxFileSize = 10
+                nsiqcppstyle_checker.ProcessFile(ruleManager, source)
+                assert(seen[-1] == ("b.cpp", 0))
+                assert(state.CheckRuleSuppression("RULE_A"))
+            finally:
+                state.maxFileSize = maxFileSize
+                shutil.rmtree(tmpDir)
+            ruleManager.AddRule(lambda lexer, contextStack: None,
+                                needs=nsiqcppstyle_rulemanager.NEEDS_TOKENS)
+            del seen[:]
+            nsiqcppstyle_checker.ProcessFile(ruleManager, "dir/a.cpp", data)
+            assert(seen[0][1] > 0)
+        finally:
+            nsiqcppstyle_state._nsiqcppstyle_state.ResetRuleSuppression()
+            ruleManager.ResetRegisteredRules()
+
+    def testReadFirstComment(self):
+        tmpDir = tempfile.mkdtemp()
+        try:
+            source = os.path.join(tmpDir, "a.cpp")
+            for text, first in (("int a;\r\n// --RULE_A\r\nint b;\r\n" + "int c;\n" * 100, "// --RULE_A"),
+                                # The "//" in the comment which isn't read to the end yet
+                                ("int a; /* x\n// --RULE_A\n*/\nint b;\n" + "int c;\n" * 100, "/* x"),
+                                ("int a;\n" * 100, None)):
+                with open(source, "w", newline="") as f:
+                    f.write(text)
+                data = nsiqcppstyle_checker.ReadFirstComment(source, 8)
+                assert(text.replace("\r\n", "\n").startswith(data))
+                comment = nsiqcppstyle_checker.FindFirstComment(data)
+                if first is None:
+                    assert(comment is None and data == text)
+                else:
+                    assert(comment.value.startswith(first) and len(data) < len(text) - 100)
+        finally:
+            shutil.rmtree(tmpDir)
+
+    def testContextNeeds(self):
+        ruleManager = nsiqcppstyle_rulemanager.ruleManager
+        ruleManager.ResetRegisteredRules()
+        seen = []
+
+        def tokenRule(lexer, contextStack):
+            seen.append((lexer.GetCurToken().type, contextStack is None))
+        try:
+            data = "// --RULE_A\nvoid f() {\n}\n"
+            ruleManager.AddRule(tokenRule, ["ID", "FUNCTION"], needs=nsiqcppstyle_rulemanager.NEEDS_TOKENS)
+            assert(not ruleManager.NeedsContext())
+            nsiqcppstyle_checker.ProcessFile(ruleManager, "a.cpp", data)
+            assert(seen == [("ID", True)])
+            assert(nsiqcppstyle_state._nsiqcppstyle_state.CheckRuleSuppression("RULE_A"))
+            ruleManager.ResetRegisteredRules()
+            ruleManager.AddRule(tokenRule, ["ID", "FUNCTION"])
+            del seen[:]
+            nsiqcppstyle_checker.ProcessFile(ruleManager, "a.cpp", data)
+            assert(seen == [("FUNCTION", False)])
+        finally:
+            nsiqcppstyle_state._nsiqcppstyle_state.ResetRuleSuppression()
+            ruleManager.ResetRegisteredRules()
+
+    def testLoadRules(self):
+        ruleManager = nsiqcppstyle_rulemanager.ruleManager
+        consoleLevel = console.GetLevel()
+        console.SetLevel(console.Level.Error)
+        longLines = "RULE_4_4_A_do_not_write_over_120_columns_per_line"
+        tabs = "RULE_4_1_A_A_use_tab_for_indentation"
+        try:
+            ruleManager.LoadRules([longLines, tabs, tabs])
+            module = ruleManager.availRuleModules[longLines]
+            assert(len(ruleManager.rawLineRules) == 1 and len(ruleManager.lineRules) == 1)
+            ruleManager.LoadRules([longLines])
+            # The module is not imported again, its rules are registered again
+            assert(ruleManager.availRuleModules[longLines] is module)
+            assert([rule for rule, pattern in ruleManager.rawLineRules] == [module.RunRule])
+            assert(ruleManager.lineRules == [])
+        finally:
+            console.SetLevel(consoleLevel)
+            ruleManager.ResetRules()
+            ruleManager.ResetRegisteredRules()
+
+    def testBufferedReport(self):
+        state = nsiqcppstyle_state._nsiqcppstyle_state
+        outputFormat, errorCount = state.output_format, state.error_count
+        consoleLevel = console.GetLevel()
+        written = []
+        flushes = []
+
+        class Output:
+            def write(self, text):
+                written.append(text)
+
+            def flush(self):
+                flushes.append(len(written))
+        output, stdout = Output(), nsiqcppstyle_reporter.sys.stdout
+        nsiqcppstyle_reporter.sys.stdout = output
+        state.output_format = "emacs"
+        console.SetLevel(console.Level.Error)
+        try:
+            nsiqcppstyle_reporter.ReportViolation("a.cpp", 1, 0, "RULE_A", "a")
+            nsiqcppstyle_reporter.ReportViolation("a.cpp", 2, 0, "RULE_B", "b")
+            assert(written == [])
+            # The violations are written before any message on the console
+            console.Out.Info("not shown")
+            assert(written == [])
+            console.Err.SetBeforeWrite(lambda: written.append("flush"))
+            console.Err.Error("")
+            assert(written == ["flush"])
+            console.Err.SetBeforeWrite(nsiqcppstyle_reporter.FlushReport)
+            console.Err.Error("")
+            assert(written == ["flush", "a.cpp:1:  a  [RULE_A] \na.cpp:2:  b  [RULE_B] \n"])
+            assert(flushes == [2])
+            del written[:]
+            nsiqcppstyle_reporter.FlushReport()
+            assert(written == [])
+        finally:
+            console.Err.SetBeforeWrite(nsiqcppstyle_reporter.FlushReport)
+            nsiqcppstyle_reporter.FlushReport()
+            nsiqcppstyle_reporter.sys.stdout = stdout
+            console.SetLevel(consoleLevel)
+            state.output_format = outputFormat
+            state.error_count = errorCount
+            state.errorPerChecker.pop("RULE_A", None)
+            state.errorPerChecker.pop("RULE_B", None)
+            state.errorPerFile.pop("a.cpp", None)
+
+    def testCsvReport(self):
+        state = nsiqcppstyle_state._nsiqcppstyle_state
+        outputFormat, errorCount = state.output_format, state.error_count
+        outputDir = tempfile.mkdtemp()
+        state.output_format = "csv"
+        try:
+            for outputPath in (outputDir, os.path.join(outputDir, "report.csv.gz")):
+                nsiqcppstyle_reporter.PrepareReport(outputPath, "csv")
+                nsiqcppstyle_reporter.ReportViolation("a.cpp", 1, 0, "RULE_A", "a, \"b\"")
+                # The rows of a file are written when the file ends
+                assert(nsiqcppstyle_reporter.csvRows)
+                nsiqcppstyle_reporter.EndFile()
+                assert(not nsiqcppstyle_reporter.csvRows)
+                nsiqcppstyle_reporter.ReportViolation("b.cpp", 2, 3, "RULE_B", "c")
+                nsiqcppstyle_reporter.CloseReport("csv")
+                assert(nsiqcppstyle_reporter.csvfile is None)
+
+            with open(os.path.join(outputDir, "nsiqcppstyle_report.csv"), newline="") as f:
+                rows = list(csv.reader(f))
+            with gzip.open(os.path.join(outputDir, "report.csv.gz"), "rt", newline="") as f:
+                assert(list(csv.reader(f)) == rows)
+            assert(rows == [["File", "Line", "Column", "Message", "Rule", "Rule Url"],
+                            ["a.cpp", "1", "0", "a, \"b\"", "RULE_A", ""],
+                            ["b.cpp", "2", "3", "c", "RULE_B", ""]])
+        finally:
+            shutil.rmtree(outputDir)
+            state.output_format = outputFormat
+            state.error_count = errorCount
+            for eachRule in ("RULE_A", "RULE_B"):
+                state.errorPerChecker.pop(eachRule, None)
+            state.errorPerFile.pop("a.cpp", None)
+            state.errorPerFile.pop("b.cpp", None)
+
+    def testResultStore(self):
+        outputDir = tempfile.mkdtemp()
+        oldPath = os.path.join(outputDir, "old.nsr")
+        newPath = os.path.join(outputDir, "new.nsr")
+        oldViolations = [("a.cpp", 1, 0, "RULE_A", "a"), ("a.cpp", 2, 0, "RULE_A", "a"),
+                         ("b.cpp", 3, 1, "RULE_B", "b"), ("b.cpp", 4, 1, "RULE_B", "\u00e9")]
+        newViolations = [("a.cpp", 5, 0, "RULE_A", "a"), ("b.cpp", 3, 1, "RULE_B", "c"),
+                         ("b.cpp", 6, 1, "RULE_B", "\u00e9"), ("c.cpp", 1, 0, "RULE_A", "a")]
+        try:
+            for path, violations in ((oldPath, oldViolations), (newPath, newViolations)):
+                writer = nsiqcppstyle_resultstore.ResultStoreWriter(path, 3)
+                for eachViolation in violations:
+                    writer.Add(*eachViolation)
+                writer.close()
+            assert(list(nsiqcppstyle_resultstore.ResultStoreReader(oldPath).Violations()) == oldViolations)
+            # The violations moved to the other lines are not new
+            newOnes, fixedOnes = nsiqcppstyle_resultstore.DiffResultStores(oldPath, newPath)
+            assert(newOnes == [("b.cpp", 3, 1, "RULE_B", "c"), ("c.cpp", 1, 0, "RULE_A", "a")])
+            assert(fixedOnes == [("a.cpp", 2, 0, "RULE_A", "a"), ("b.cpp", 3, 1, "RULE_B", "b")])
+            assert(nsiqcppstyle_resultstore.DiffResultStores(newPath, newPath) == ([], []))
+
+            with open(newPath, "r+b") as f:
+                f.truncate(os.path.getsize(newPath) - 1)
+            self.assertRaises(ValueError, list,
+                              nsiqcppstyle_resultstore.ResultStoreReader(newPath).Violations())
+            self.assertRaises(ValueError, list,
+                              nsiqcppstyle_resultstore.ResultStoreReader(__file__).Violations())
+        finally:
+            shutil.rmtree(outputDir)
+
+    def testResultStoreRoots(self):
+        outputDir = tempfile.mkdtemp()
+        oldPath = os.path.join(outputDir, "old.nsr")
+        newPath = os.path.join(outputDir, "new.nsr")
+        try:
+            # The same targets checked out in different directories
+            for path, checkout, libFiles in ((oldPath, "ci", ["a.cpp", "b.cpp"]), (newPath, "local", ["b.cpp"])):
+                writer = nsiqcppstyle_resultstore.ResultStoreWriter(path, 2)
+                for target, files in (("src", []), ("lib", libFiles), ("test", ["a.cpp"])):
+                    targetPath = os.path.join(outputDir, checkout, target)
+                    os.makedirs(targetPath)
+                    writer.SetTarget(targetPath)
+                    for eachFile in files:
+                        writer.Add(os.path.join(targetPath, eachFile), 1, 0, "RULE_A", "a")
+                writer.close()
+            reader = nsiqcppstyle_resultstore.ResultStoreReader(newPath)
+            assert([violation[0] for violation in reader.Violations()] ==
+                   [os.path.join(outputDir, "local", "lib", "b.cpp"),
+                    os.path.join(outputDir, "local", "test", "a.cpp")])
+            # Only the violation of the file of the lib target is fixed
+            newOnes, fixedOnes = nsiqcppstyle_resultstore.DiffResultStores(oldPath, newPath)
+            assert(newOnes == [])
+            assert(fixedOnes == [(os.path.join(outputDir, "ci", "lib", "a.cpp"), 1, 0, "RULE_A", "a")])
+        finally:
+            shutil.rmtree(outputDir)
+
+    def testStreamedReports(self):
+        state = nsiqcppstyle_state._nsiqcppstyle_state
+        outputFormat, errorCount = state.output_format, state.error_count
+        outputDir = tempfile.mkdtemp()
+        try:
+            for eachFormat in ("sarif", "jsonl", "store"):
+                state.output_format = eachFormat
+                nsiqcppstyle_reporter.PrepareReport(outputDir, eachFormat, "1.0")
+                nsiqcppstyle_reporter.ReportRules(["RULE_A", "RULE_B"], ["RULE_B"])
+                nsiqcppstyle_reporter.ReportRules(["RULE_A", "RULE_B"], ["RULE_B"])
+                nsiqcppstyle_reporter.ReportViolation("a.cpp", 1, 0, "RULE_B", "a \"b\"")
+                if eachFormat == "jsonl":
+                    # Each violation can be read as soon as it's reported
+                    with open(os.path.join(outputDir, "nsiqcppstyle_report.jsonl")) as f:
+                        assert(json.loads(f.readline())["message"] == "a \"b\"")
+                nsiqcppstyle_reporter.ReportViolation("b.cpp", 2, 3, "RULE_C", "c")
+                nsiqcppstyle_reporter.CloseReport(eachFormat)
+
+            with open(os.path.join(outputDir, "nsiqcppstyle_report.sarif")) as f:
+                run = json.load(f)["runs"][0]
+            assert(run["tool"]["driver"]["version"] == "1.0")
+            assert([rule["id"] for rule in run["tool"]["driver"]["rules"]] == ["RULE_A", "RULE_B"])
+            results = run["results"]
+            assert(len(results) == 2)
+            assert(results[0]["ruleId"] == "RULE_B" and results[0]["ruleIndex"] == 1)
+            assert(results[0]["message"]["text"] == "a \"b\"")
+            assert("ruleIndex" not in results[1])
+            location = results[1]["locations"][0]["physicalLocation"]
+            assert(location["artifactLocation"]["uri"] == "b.cpp")
+            assert(location["region"] == {"startLine": 2, "startColumn": 3})
+            # The columns of the tokens start at 1, only the ones of the files at 0
+            assert(results[0]["locations"][0]["physicalLocation"]["region"]["startColumn"] == 1)
+
+            with open(os.path.join(outputDir, "nsiqcppstyle_report.jsonl")) as f:
+                lines = [json.loads(line) for line in f]
+            assert(lines[1] == {"file": "b.cpp", "line": 2, "column": 3,
+                                "rule": "RULE_C", "message": "c", "url": ""})
+            assert(len(lines) == 2)
+
+            reader = nsiqcppstyle_resultstore.ResultStoreReader(
+                os.path.join(outputDir, "nsiqcppstyle_report.nsr"))
+            assert(list(reader.Violations()) == [("a.cpp", 1, 0, "RULE_B", "a \"b\""),
+                                                 ("b.cpp", 2, 3, "RULE_C", "c")])
+        finally:
+            shutil.rmtree(outputDir)
+            state.output_format = outputFormat
+            state.error_count = errorCount
+            for eachRule in ("RULE_B", "RULE_C"):
+                state.errorPerChecker.pop(eachRule, None)
+            state.errorPerFile.pop("a.cpp", None)
+            state.errorPerFile.pop("b.cpp", None)
+
+    def testReportAsFound(self):
+        ruleManager = nsiqcppstyle_rulemanager.ruleManager
+        ruleManager.ResetRegisteredRules()
+        state = nsiqcppstyle_state._nsiqcppstyle_state
+        outputFormat, errorCount = state.output_format, state.error_count
+        outputDir = tempfile.mkdtemp()
+        reportPath = os.path.join(outputDir, "nsiqcppstyle_report.jsonl")
+        written = []
+
+        def tokenRule(lexer, contextStack):
+            t = lexer.GetCurToken()
+            if t.value == "a":
+                nsiqcppstyle_reporter.ErrorInternal(t, "rules.RULE_A", "a")
+            elif t.value == "b":
+                with open(reportPath) as f:
+                    written.append(len(f.readlines()))
+        try:
+            ruleManager.AddRule(tokenRule, needs=nsiqcppstyle_rulemanager.NEEDS_TOKENS)
+            source = os.path.join(outputDir, "a.cpp")
+            with open(source, "w") as f:
+                f.write("int a;\nint b;\n")
+            state.output_format = "jsonl"
+            nsiqcppstyle_reporter.PrepareReport(outputDir, "jsonl", "1.0")
+            analyzedFiles = []
+            # Without the cache and the worker processes, nothing is kept until the file is done
+            nsiqcppstyle_exe.ProcessFile(ruleManager, source, analyzedFiles)
+            nsiqcppstyle_reporter.CloseReport("jsonl")
+            assert(written == [1] and analyzedFiles == [source])
+        finally:
+            state.output_format = outputFormat
+            state.error_count = errorCount
+            ruleManager.ResetRegisteredRules()
+            shutil.rmtree(outputDir)
+
+    def testLineSuppression(self):
+        data = "a; // NS\nb; // NS RULE_4_1_A, RULE_X\nc; //NS: RULE_B\nd; /* // NS RULE_C */ // NS\ne;\n"
+        lexer = nsiqcppstyle_checker.CppLexerNavigator("a.cpp", data)
+        assert(lexer.suppressedLines == {1: (), 2: ("RULE_4_1_A", "RULE_X"), 3: ("RULE_B",), 4: ()})
+        assert(lexer.IsSuppressed(1, "RULE_A"))
+        assert(lexer.IsSuppressed(2, "RULE_4_1_A_A_use_tab_for_indentation"))
+        assert(lexer.IsSuppressed(2, "RULE_X"))
+        assert(lexer.IsSuppressed(2, "RULE_X_1_1"))
+        assert(not lexer.IsSuppressed(2, "RULE_XY"))
+        assert(not lexer.IsSuppressed(5, "RULE_A"))
+        assert(nsiqcppstyle_checker.GetLineSuppression("b; // NS RULE_X") == ("RULE_X",))
+        assert(nsiqcppstyle_checker.GetLineSuppression("b; // N S") is None)
+        # The violations are dropped and the line rules don't run on the suppressed lines
+        ruleManager = nsiqcppstyle_rulemanager.ruleManager
+        ruleManager.ResetRegisteredRules()
+        seen = []
+
+        def lineRule(lexer, line, lineno):
+            seen.append(lineno)
+            nsiqcppstyle_reporter.Error(nsiqcppstyle_reporter.DummyToken(lexer.filename, line, lineno, 0),
+                                        "rules.RULE_X", "")
+            nsiqcppstyle_reporter.Error(lexer.GetCurToken(), "rules.RULE_Y", "")
+        lineRule.__module__ = "rules.RULE_X"
+        nsiqcppstyle_reporter.StartRecording()
+        try:
+            ruleManager.AddLineRule(lineRule, needs=nsiqcppstyle_rulemanager.NEEDS_TOKENS)
+            nsiqcppstyle_checker.ProcessFile(ruleManager, "a.cpp", data)
+        finally:
+            violations = nsiqcppstyle_reporter.StopRecording()
+            ruleManager.ResetRegisteredRules()
+        assert(seen == [3, 5])
+        assert([(lineno, rule) for filename, lineno, column, rule, message in violations] ==
+               [(3, "RULE_X"), (3, "RULE_Y"), (5, "RULE_X"), (5, "RULE_Y")])
+
+    def testReadSource(self):
+        text = "int ä;\r\nchar b;\rlong c;\n"
+        tmpDir = tempfile.mkdtemp()
+        consoleLevel = console.GetLevel()
+        console.SetLevel(console.Level.Error)
+        try:
+            source = os.path.join(tmpDir, "a.cpp")
+            for encoding in ("utf-8", "utf-8-sig", "utf-16", "utf-16-le", "utf-16-be",
+                             "utf-32", "latin-1"):
+                with open(source, "wb") as f:
+                    f.write(text.encode(encoding))
+                assert(nsiqcppstyle_checker.ReadSource(source) == "int ä;\nchar b;\nlong c;\n")
+                with nsiqcppstyle_checker.OpenSource(source) as f:
+                    assert(f.read() == "int ä;\nchar b;\nlong c;\n")
+            # A stray zero byte does not make the file UTF-16
+            for encoding in ("utf-8", "latin-1"):
+                with open(source, "wb") as f:
+                    f.write(("int ä;\0\n" + "long c;\n" * 10).encode(encoding))
+                assert(nsiqcppstyle_checker.ReadSource(source) == "int ä;\0\n" + "long c;\n" * 10)
+            open(source, "w").close()
+            assert(nsiqcppstyle_checker.ReadSource(source) == "")
+            lexer = nsiqcppstyle_checker.CppLexerNavigator("a.cpp", "a\n\fb\n")
+            # Only \n breaks the lines
+            assert(len(lexer.lines) == 3 and lexer.lines[1] == "\fb" and lexer.lines[-1] == "")
+            assert(lexer.lines[:2] == ["a", "\fb"])
+            assert(lexer.tokenlist[-2].line == "\fb")
+        finally:
+            console.SetLevel(consoleLevel)
+            shutil.rmtree(tmpDir)
@@ -25,6 +25,7 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import os
 import nsiqcppstyle_checker
 from nsiqcppstyle_outputer import _consoleOutputer as console
 import unittest
@@ -54,6 +55,8 @@ class nct(unittest.TestCase):
     def Analyze(self, filename, data):
         nsiqcppstyle_checker.ProcessFile(
             nsiqcppstyle_rulemanager.ruleManager, filename, data)
+        nsiqcppstyle_rulemanager.ruleManager.RunSessionFileRule(
+            os.path.basename(filename), os.path.dirname(filename))
 
     def ExpectError(self, msg):
         result = self._CheckErrorContent(msg)
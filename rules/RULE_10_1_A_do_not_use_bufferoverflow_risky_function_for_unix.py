@@ -74,7 +74,8 @@ def RunRule(lexer, contextStack):
                                                 "Caution: Uknown imlementation of a bufferoverflow risky function(%s)" % t.value)
 
 
-ruleManager.AddFunctionScopeRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddFunctionScopeRule(RunRule, ["ID"])
 
 ##########################################################################
 # Unit Test
@@ -83,7 +84,7 @@ ruleManager.AddFunctionScopeRule(RunRule)
 
 class testRule(nct):
     def setUpRule(self):
-        ruleManager.AddFunctionScopeRule(RunRule)
+        ruleManager.AddFunctionScopeRule(RunRule, ["ID"])
 
     def test1(self):
         self.Analyze("thisfile.c",
@@ -96,7 +96,8 @@ def RunRule(lexer, contextStack):
                                                 "Do not use burfferoverflow risky function(%s)" % t.value)
 
 
-ruleManager.AddFunctionScopeRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddFunctionScopeRule(RunRule, ["ID"])
 
 ##########################################################################
 # Unit Test
@@ -105,7 +106,7 @@ ruleManager.AddFunctionScopeRule(RunRule)
 
 class testRule(nct):
     def setUpRule(self):
-        ruleManager.AddFunctionScopeRule(RunRule)
+        ruleManager.AddFunctionScopeRule(RunRule, ["ID"])
 
     def test1(self):
         self.Analyze("thisfile.c",
@@ -22,7 +22,8 @@ def RunRule(lexer, filename, dirname):
             lexer.filename, "", 0, 0), __name__, "File name(%s) should not start with underbar." % filename)
 
 
-ruleManager.AddFileStartRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddFileStartRule(RunRule, needs=NEEDS_NAME)
 
 ##########################################################################
 # Unit Test
@@ -31,7 +32,7 @@ ruleManager.AddFileStartRule(RunRule)
 
 class testRule(nct):
     def setUpRule(self):
-        ruleManager.AddFileStartRule(RunRule)
+        ruleManager.AddFileStartRule(RunRule, needs=NEEDS_NAME)
 
     def test1(self):
         self.Analyze("_thisfile.c", "")
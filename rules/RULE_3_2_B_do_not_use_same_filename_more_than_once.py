@@ -26,7 +26,7 @@ import string
 filenameMap = {}
 
 
-def RunRule(lexer, filename, dirname):
+def RunRule(filename, dirname):
     if filename.startswith("stdafx."):
         return
     if filename.startswith("main.c"):
@@ -37,12 +37,18 @@ def RunRule(lexer, filename, dirname):
         filenameMap[filename].append(os.path.join(dirname, filename))
     else:
         filenameMap[filename].append(os.path.join(dirname, filename))
-        nsiqcppstyle_reporter.Error(DummyToken(lexer.filename, "", 0, 0), __name__,
+        nsiqcppstyle_reporter.Error(DummyToken(os.path.join(dirname, filename), "", 0, 0), __name__,
                                     'Do not use same filename(%s) more than once. This filename is used in %s' % (
                                         filename, ", ".join(filenameMap[filename])))
 
 
-ruleManager.AddFileStartRule(RunRule)
+def RunSessionStartRule():
+    filenameMap.clear()
+
+
+def RegisterRules(ruleManager):
+    ruleManager.AddSessionFileRule(RunRule)
+    ruleManager.AddSessionStartRule(RunSessionStartRule)
 
 ##########################################################################
 # Unit Test
@@ -51,7 +57,7 @@ ruleManager.AddFileStartRule(RunRule)
 
 class testRule(nct):
     def setUpRule(self):
-        ruleManager.AddFileStartRule(RunRule)
+        ruleManager.AddSessionFileRule(RunRule)
         global filenameMap
         filenameMap = {}
 
@@ -82,3 +88,12 @@ class testRule(nct):
         self.Analyze("test2/main.c", "")
         self.Analyze("test/thisfile.h", "")
         self.ExpectSuccess(__name__)
+
+    def test4(self):
+        """
+            Test for the files of the targets which are checked one after another
+        """
+        self.Analyze("test/thisfile.c", "")
+        RunSessionStartRule()
+        self.Analyze("test2/thisfile.c", "")
+        self.ExpectSuccess(__name__)
@@ -78,10 +78,11 @@ def RunFileEndRule(lexer, filename, dirname):
                                     "The filename does not represent the classnames (%s)" % (classname))
 
 
-ruleManager.AddFileStartRule(RunFileStartRule)
-ruleManager.AddTypeNameRule(RunTypeNameRule)
-ruleManager.AddFunctionNameRule(RunFunctionNameRule)
-ruleManager.AddFileEndRule(RunFileEndRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddFileStartRule(RunFileStartRule)
+    ruleManager.AddTypeNameRule(RunTypeNameRule)
+    ruleManager.AddFunctionNameRule(RunFunctionNameRule)
+    ruleManager.AddFileEndRule(RunFileEndRule)
 
 ##########################################################################
 # Unit Test
@@ -32,7 +32,8 @@ def RunRule(lexer, filename, dirname):
                                     "Do not use underbar for cpp file name (%s)." % filename)
 
 
-ruleManager.AddFileStartRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddFileStartRule(RunRule, needs=NEEDS_NAME)
 
 ##########################################################################
 # Unit Test
@@ -41,7 +42,7 @@ ruleManager.AddFileStartRule(RunRule)
 
 class testRule(nct):
     def setUpRule(self):
-        ruleManager.AddFileStartRule(RunRule)
+        ruleManager.AddFileStartRule(RunRule, needs=NEEDS_NAME)
 
     def test1(self):
         self.Analyze("test/thisfile.cpp", "")
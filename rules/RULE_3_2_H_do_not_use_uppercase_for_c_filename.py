@@ -25,7 +25,8 @@ def RunRule(lexer, filename, dirname):
                                     "Do not use uppercase for c file name (%s)." % filename)
 
 
-ruleManager.AddFileStartRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddFileStartRule(RunRule, needs=NEEDS_NAME)
 
 ##########################################################################
 # Unit Test
@@ -34,7 +35,7 @@ ruleManager.AddFileStartRule(RunRule)
 
 class testRule(nct):
     def setUpRule(self):
-        ruleManager.AddFileStartRule(RunRule)
+        ruleManager.AddFileStartRule(RunRule, needs=NEEDS_NAME)
 
     def test1(self):
         self.Analyze("test/thisFile.c", "")
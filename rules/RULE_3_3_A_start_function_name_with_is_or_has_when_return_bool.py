@@ -44,7 +44,8 @@ def RunRule(lexer, fullName, decl, contextStack, context):
         k += 1
 
 
-ruleManager.AddFunctionNameRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddFunctionNameRule(RunRule)
 
 ##########################################################################
 # Unit Test
@@ -49,7 +49,8 @@ def RunRule(lexer, fullName, decl, contextStack, context):
                 t, __name__, "Do not start function name(%s) with lowercase" % fullName)
 
 
-ruleManager.AddFunctionNameRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddFunctionNameRule(RunRule)
 
 ##########################################################################
 # Unit Test
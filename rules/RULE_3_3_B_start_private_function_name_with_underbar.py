@@ -49,8 +49,9 @@ def RunTypeScopeRule(lexer, contextStack):
             curContext.additional = t.type
 
 
-ruleManager.AddFunctionNameRule(RunRule)
-ruleManager.AddTypeScopeRule(RunTypeScopeRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddFunctionNameRule(RunRule)
+    ruleManager.AddTypeScopeRule(RunTypeScopeRule, ["PUBLIC", "PRIVATE", "PROTECTED"])
 
 ##########################################################################
 # Unit Test
@@ -60,7 +61,7 @@ ruleManager.AddTypeScopeRule(RunTypeScopeRule)
 class testRule(nct):
     def setUpRule(self):
         ruleManager.AddFunctionNameRule(RunRule)
-        ruleManager.AddTypeScopeRule(RunTypeScopeRule)
+        ruleManager.AddTypeScopeRule(RunTypeScopeRule, ["PUBLIC", "PRIVATE", "PROTECTED"])
         global currentVisibility
         currentVisibility = False
 
@@ -37,7 +37,8 @@ def RunRule(lexer, typeName, typeFullName, decl, contextStack, typeContext):
                     t, __name__, "Enum block should be indented. But the token(%s) seems to be unindented" % t.value)
 
 
-ruleManager.AddTypeNameRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddTypeNameRule(RunRule)
 
 
 ##########################################################################
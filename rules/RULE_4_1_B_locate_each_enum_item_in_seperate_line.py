@@ -41,7 +41,8 @@ def RunRule(lexer, typeName, typeFullName, decl, contextStack, typeContext):
                         nt2, __name__, "Each enum item(%s) should be located in the different line" % nt2.value)
 
 
-ruleManager.AddTypeNameRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddTypeNameRule(RunRule)
 
 ##########################################################################
 # Unit Test
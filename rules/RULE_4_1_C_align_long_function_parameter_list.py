@@ -39,7 +39,8 @@ def RunRule(lexer, fullName, decl, contextStack, context):
                     t, __name__, "Incorrect align on long parameter list in front of '%s', it should be aligen in column %d." % (t.value, firstElementColumn))
 
 
-ruleManager.AddFunctionNameRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddFunctionNameRule(RunRule)
 
 ##########################################################################
 # Unit Test
@@ -39,7 +39,8 @@ def RunRule(lexer, contextStack):
                             t3, __name__, "Incorrect align on condition list '%s'. It should be aligned in column %d. " % (t3.value, firstElementColumn))
 
 
-ruleManager.AddFunctionScopeRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddFunctionScopeRule(RunRule, ["IF", "WHILE"])
 
 ##########################################################################
 # Unit Test
@@ -48,7 +49,7 @@ ruleManager.AddFunctionScopeRule(RunRule)
 
 class testRule(nct):
     def setUpRule(self):
-        ruleManager.AddFunctionScopeRule(RunRule)
+        ruleManager.AddFunctionScopeRule(RunRule, ["IF", "WHILE"])
 
     def test1(self):
         self.Analyze("test/thisFile.c",
@@ -112,8 +112,9 @@ def RunRule(lexer, contextStack):
                                             "Provide spaces after operator '%s'" % t.value)
 
 
-ruleManager.AddRule(RunRule)
-ruleManager.AddPreprocessRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddRule(RunRule, operator + nextoperator + unaryoperator)
+    ruleManager.AddPreprocessRule(RunRule, operator + nextoperator + unaryoperator)
 
 
 ##########################################################################
@@ -123,8 +124,8 @@ ruleManager.AddPreprocessRule(RunRule)
 
 class testRule(nct):
     def setUpRule(self):
-        ruleManager.AddRule(RunRule)
-        ruleManager.AddPreprocessRule(RunRule)
+        ruleManager.AddRule(RunRule, operator + nextoperator + unaryoperator)
+        ruleManager.AddPreprocessRule(RunRule, operator + nextoperator + unaryoperator)
 
     def test1(self):
         self.Analyze("test/thisFile.c",
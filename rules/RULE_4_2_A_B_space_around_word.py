@@ -53,8 +53,9 @@ def RunRule(lexer, contextStack):
                                                 "Put space before/after word '%s'." % t.value)
 
 
-ruleManager.AddFunctionScopeRule(RunRule)
-ruleManager.AddPreprocessRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddFunctionScopeRule(RunRule, words)
+    ruleManager.AddPreprocessRule(RunRule, words)
 
 ##########################################################################
 # Unit Test
@@ -63,8 +64,8 @@ ruleManager.AddPreprocessRule(RunRule)
 
 class testRule(nct):
     def setUpRule(self):
-        ruleManager.AddFunctionScopeRule(RunRule)
-        ruleManager.AddPreprocessRule(RunRule)
+        ruleManager.AddFunctionScopeRule(RunRule, words)
+        ruleManager.AddPreprocessRule(RunRule, words)
 
     def test1(self):
         self.Analyze("test/thisFile.c",
@@ -18,6 +18,9 @@ from nsiqcppstyle_rulemanager import *
 
 
 def RunRule(lexer, line, lineno):
+    # Only the lines with tokens are checked, not the ones in the comments
+    if not lexer.IsTokenLine(lineno):
+        return
     if not Match(r"^\s*$", line):
         if len(line) > 120:
             nsiqcppstyle_reporter.Error(DummyToken(
@@ -27,7 +30,8 @@ def RunRule(lexer, line, lineno):
             pass
 
 
-ruleManager.AddLineRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddRawLineRule(RunRule, r"^.{121}", NEEDS_TOKENS)
 
 ##########################################################################
 # Unit Test
@@ -36,7 +40,7 @@ ruleManager.AddLineRule(RunRule)
 
 class testRule(nct):
     def setUpRule(self):
-        ruleManager.AddLineRule(RunRule)
+        ruleManager.AddRawLineRule(RunRule, r"^.{121}", NEEDS_TOKENS)
 
     def test1(self):
         self.Analyze("test/thisFile.c",
@@ -58,3 +62,15 @@ void function(int k, int j, int pp)
 }
 """ % ("d" * 119, " " * 130))
         self.ExpectSuccess(__name__)
+
+    def test3(self):
+        self.Analyze("test/thisFile.c",
+                     """
+/*
+%s
+*/
+void function(int k, int j, int pp)
+{
+}
+""" % ("d" * 121))
+        self.ExpectSuccess(__name__)
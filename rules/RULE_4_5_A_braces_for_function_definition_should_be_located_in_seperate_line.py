@@ -47,7 +47,8 @@ def RunRule(lexer, fullName, decl, contextStack, typeContext):
                         t2, __name__, "The brace for function definition should be located in same column")
 
 
-ruleManager.AddFunctionNameRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddFunctionNameRule(RunRule)
 
 ##########################################################################
 # Unit Test
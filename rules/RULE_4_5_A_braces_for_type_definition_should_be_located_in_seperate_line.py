@@ -45,7 +45,8 @@ def RunRule(lexer, currentType, fullName, decl, contextStack, typeContext):
                         t2, __name__, "The brace for type definition should be located in same column")
 
 
-ruleManager.AddTypeNameRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddTypeNameRule(RunRule)
 
 ##########################################################################
 # Unit Test
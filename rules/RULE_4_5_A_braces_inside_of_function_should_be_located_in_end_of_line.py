@@ -47,7 +47,8 @@ def RunRule(lexer, contextStack):
                     t, __name__, "Braces inside of function should be located in the next of previous token(%s)" % prevToken.value)
 
 
-ruleManager.AddFunctionScopeRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddFunctionScopeRule(RunRule, ["LBRACE"])
 
 ##########################################################################
 # Unit Test
@@ -56,7 +57,7 @@ ruleManager.AddFunctionScopeRule(RunRule)
 
 class testRule(nct):
     def setUpRule(self):
-        ruleManager.AddFunctionScopeRule(RunRule)
+        ruleManager.AddFunctionScopeRule(RunRule, ["LBRACE"])
 
     def test1(self):
         self.Analyze("thisfile.c", """
@@ -62,7 +62,8 @@ def RunRule(lexer, contextStack):
                                             "Indent in the block. token(%s) seems to be located left column of previsous brace" % nt.value)
 
 
-ruleManager.AddFunctionScopeRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddFunctionScopeRule(RunRule, ["LBRACE"])
 
 ##########################################################################
 # Unit Test
@@ -71,7 +72,7 @@ ruleManager.AddFunctionScopeRule(RunRule)
 
 class testRule(nct):
     def setUpRule(self):
-        ruleManager.AddFunctionScopeRule(RunRule)
+        ruleManager.AddFunctionScopeRule(RunRule, ["LBRACE"])
 
     def test1(self):
         self.Analyze("thisfile.c", """
@@ -40,7 +40,8 @@ def RunRule(lexer, contextStack):
                                             "Matching Braces inside of function should be located in the same column ")
 
 
-ruleManager.AddFunctionScopeRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddFunctionScopeRule(RunRule, ["RBRACE"])
 
 ##########################################################################
 # Unit Test
@@ -49,7 +50,7 @@ ruleManager.AddFunctionScopeRule(RunRule)
 
 class testRule(nct):
     def setUpRule(self):
-        ruleManager.AddFunctionScopeRule(RunRule)
+        ruleManager.AddFunctionScopeRule(RunRule, ["RBRACE"])
 
     def test1(self):
         self.Analyze("thisfile.c", """
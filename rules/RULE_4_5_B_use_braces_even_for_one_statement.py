@@ -50,7 +50,8 @@ def RunRule(lexer, contextStack):
                 t, __name__, "use brace for even on statement in else clause")
 
 
-ruleManager.AddFunctionScopeRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddFunctionScopeRule(RunRule, ["IF", "WHILE", "FOR", "ELSE"])
 
 ##########################################################################
 # Unit Test
@@ -59,7 +60,7 @@ ruleManager.AddFunctionScopeRule(RunRule)
 
 class testRule(nct):
     def setUpRule(self):
-        ruleManager.AddFunctionScopeRule(RunRule)
+        ruleManager.AddFunctionScopeRule(RunRule, ["IF", "WHILE", "FOR", "ELSE"])
 
     def test1(self):
         self.Analyze("thisfile.c", """
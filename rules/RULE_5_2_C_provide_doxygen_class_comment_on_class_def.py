@@ -46,7 +46,8 @@ def RunRule(lexer, currentType, fullName, decl, contextStack, typeContext):
             t, __name__, "Doxygen Comment should be provided in front of class def(%s)." % fullName)
 
 
-ruleManager.AddTypeNameRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddTypeNameRule(RunRule)
 
 ##########################################################################
 # Unit Test
@@ -49,7 +49,8 @@ def RunRule(lexer, currentType, fullName, decl, contextStack, typeContext):
                                     % fullName)
 
 
-ruleManager.AddTypeNameRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddTypeNameRule(RunRule)
 
 
 ##########################################################################
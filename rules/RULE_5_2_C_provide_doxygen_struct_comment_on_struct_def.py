@@ -47,7 +47,8 @@ def RunRule(lexer, currentType, fullName, decl, contextStack, context):
             t, __name__, "Doxygen Comment should be provided in front of struct/union def(%s)." % fullName)
 
 
-ruleManager.AddTypeNameRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddTypeNameRule(RunRule)
 
 
 ##########################################################################
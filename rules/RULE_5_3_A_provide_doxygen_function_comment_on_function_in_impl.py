@@ -85,9 +85,6 @@ def RunRule(lexer, fullName, decl, contextStack, context):
             t, __name__, "Doxygen Comment should be provided in front of function (%s) in impl file." % fullName)
 
 
-ruleManager.AddFunctionNameRule(RunRule)
-
-
 def RunTypeScopeRule(lexer, contextStack):
     t = lexer.GetCurToken()
     if t.type in ["PUBLIC", "PRIVATE", "PROTECTED"]:
@@ -96,7 +93,9 @@ def RunTypeScopeRule(lexer, contextStack):
             curContext.additional = t.type
 
 
-ruleManager.AddTypeScopeRule(RunTypeScopeRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddFunctionNameRule(RunRule)
+    ruleManager.AddTypeScopeRule(RunTypeScopeRule, ["PUBLIC", "PRIVATE", "PROTECTED"])
 
 
 ##########################################################################
@@ -107,7 +106,7 @@ ruleManager.AddTypeScopeRule(RunTypeScopeRule)
 class testRule(nct):
     def setUpRule(self):
         ruleManager.AddFunctionNameRule(RunRule)
-        ruleManager.AddTypeScopeRule(RunTypeScopeRule)
+        ruleManager.AddTypeScopeRule(RunTypeScopeRule, ["PUBLIC", "PRIVATE", "PROTECTED"])
 
     def test1(self):
         self.Analyze("thisfile.c",
@@ -45,7 +45,8 @@ def RunRule(lexer, fullName, decl, contextStack, context):
             break
 
 
-ruleManager.AddFunctionNameRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddFunctionNameRule(RunRule)
 
 
 ##########################################################################
@@ -36,7 +36,8 @@ def RunRule(lexer, fullName, decl, contextStack, context):
                 context.startToken, __name__, "Do not write function over non blank 200 lines(%s)." % fullName)
 
 
-ruleManager.AddFunctionNameRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddFunctionNameRule(RunRule)
 
 ##########################################################################
 # Unit Test
@@ -29,7 +29,8 @@ def RunRule(lexer, contextStack):
                                         "Do not use system dependent type(%s). Use system independent type like (%s)" % (t.value, systemDependentType[t.type]))
 
 
-ruleManager.AddRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddRule(RunRule, ["SHORT", "LONG", "INT"])
 
 
 ##########################################################################
@@ -39,7 +40,7 @@ ruleManager.AddRule(RunRule)
 
 class testRule(nct):
     def setUpRule(self):
-        ruleManager.AddRule(RunRule)
+        ruleManager.AddRule(RunRule, ["SHORT", "LONG", "INT"])
 
     def test1(self):
         self.Analyze("thisfile.c",
@@ -32,7 +32,8 @@ def RunRule(lexer, typeName, typeFullName, decl, contextStack, typeContext):
                                         "The first item(%s) of enum type(%s) should be initialized." % (t2.value, typeFullName))
 
 
-ruleManager.AddTypeNameRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddTypeNameRule(RunRule)
 
 
 ##########################################################################
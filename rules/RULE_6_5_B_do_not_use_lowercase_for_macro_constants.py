@@ -31,7 +31,8 @@ def RunRule(lexer, contextStack):
                     d, __name__, "Do not use lower case (%s) for macro value" % d.value)
 
 
-ruleManager.AddPreprocessRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddPreprocessRule(RunRule, ["PREPROCESSOR"], needs=NEEDS_TOKENS)
 
 ##########################################################################
 # Unit Test
@@ -40,7 +41,7 @@ ruleManager.AddPreprocessRule(RunRule)
 
 class testRule(nct):
     def setUpRule(self):
-        ruleManager.AddPreprocessRule(RunRule)
+        ruleManager.AddPreprocessRule(RunRule, ["PREPROCESSOR"], needs=NEEDS_TOKENS)
 
     def test1(self):
         self.Analyze("thisfile.c", """
@@ -37,7 +37,8 @@ def RunRule(lexer, contextStack):
                                             "Do not use macro(%s) for constant" % d.value)
 
 
-ruleManager.AddPreprocessRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddPreprocessRule(RunRule, ["PREPROCESSOR"], needs=NEEDS_TOKENS)
 
 
 ##########################################################################
@@ -47,7 +48,7 @@ ruleManager.AddPreprocessRule(RunRule)
 
 class testRule(nct):
     def setUpRule(self):
-        ruleManager.AddPreprocessRule(RunRule)
+        ruleManager.AddPreprocessRule(RunRule, ["PREPROCESSOR"], needs=NEEDS_TOKENS)
 
     def test1(self):
         self.Analyze("thisfile.c", """
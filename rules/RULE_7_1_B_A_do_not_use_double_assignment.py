@@ -34,7 +34,8 @@ def RunRule(lexer, line, lineno):
                 lexer.filename, line, lineno, 0), __name__, "Do not use double assignment in a same line")
 
 
-ruleManager.AddLineRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddLineRule(RunRule, needs=NEEDS_TOKENS)
 
 ##########################################################################
 # Unit Test
@@ -43,7 +44,7 @@ ruleManager.AddLineRule(RunRule)
 
 class testRule(nct):
     def setUpRule(self):
-        ruleManager.AddLineRule(RunRule)
+        ruleManager.AddLineRule(RunRule, needs=NEEDS_TOKENS)
 
     def test1(self):
         self.Analyze("thisfile.c", """
@@ -33,8 +33,9 @@ def RunRule(lexer, contextStack):
             nsiqcppstyle_reporter.Error(t, __name__, "Do not use ? keyword")
 
 
-ruleManager.AddFunctionScopeRule(RunRule)
-ruleManager.AddPreprocessRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddFunctionScopeRule(RunRule, ["TERNARY"])
+    ruleManager.AddPreprocessRule(RunRule, ["TERNARY"])
 
 ##########################################################################
 # Unit Test
@@ -43,8 +44,8 @@ ruleManager.AddPreprocessRule(RunRule)
 
 class testRule(nct):
     def setUpRule(self):
-        ruleManager.AddFunctionScopeRule(RunRule)
-        ruleManager.AddPreprocessRule(RunRule)
+        ruleManager.AddFunctionScopeRule(RunRule, ["TERNARY"])
+        ruleManager.AddPreprocessRule(RunRule, ["TERNARY"])
 
     def test1(self):
         self.Analyze("thisfile.c", """
@@ -36,8 +36,9 @@ def RunRule(lexer, contextStack):
         nsiqcppstyle_reporter.Error(t, __name__, "Do not use goto keyword")
 
 
-ruleManager.AddFunctionScopeRule(RunRule)
-ruleManager.AddPreprocessRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddFunctionScopeRule(RunRule, ["GOTO"])
+    ruleManager.AddPreprocessRule(RunRule, ["GOTO"])
 
 ##########################################################################
 # Unit Test
@@ -46,8 +47,8 @@ ruleManager.AddPreprocessRule(RunRule)
 
 class testRule(nct):
     def setUpRule(self):
-        ruleManager.AddFunctionScopeRule(RunRule)
-        ruleManager.AddPreprocessRule(RunRule)
+        ruleManager.AddFunctionScopeRule(RunRule, ["GOTO"])
+        ruleManager.AddPreprocessRule(RunRule, ["GOTO"])
 
     def test1(self):
         self.Analyze("thisfile.c", """
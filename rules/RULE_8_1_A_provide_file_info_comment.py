@@ -74,7 +74,8 @@ def RunRule(lexer, filename, dirname):
         token = lexer.GetNextTokenSkipWhiteSpace()
 
 
-ruleManager.AddFileStartRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddFileStartRule(RunRule, needs=NEEDS_TOKENS)
 
 ##########################################################################
 # Unit Test
@@ -83,7 +84,7 @@ ruleManager.AddFileStartRule(RunRule)
 
 class testRule(nct):
     def setUpRule(self):
-        ruleManager.AddFileStartRule(RunRule)
+        ruleManager.AddFileStartRule(RunRule, needs=NEEDS_TOKENS)
 
     def test1(self):
         self.Analyze("thisfile.c",
@@ -29,7 +29,8 @@ def RunRule(lexer, contextStack):
                     d, __name__, "Do not use absolute path(%s) in the include path" % value)
 
 
-ruleManager.AddPreprocessRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddPreprocessRule(RunRule, ["PREPROCESSOR"], needs=NEEDS_TOKENS)
 
 ##########################################################################
 # Unit Test
@@ -38,7 +39,7 @@ ruleManager.AddPreprocessRule(RunRule)
 
 class testRule(nct):
     def setUpRule(self):
-        ruleManager.AddPreprocessRule(RunRule)
+        ruleManager.AddPreprocessRule(RunRule, ["PREPROCESSOR"], needs=NEEDS_TOKENS)
 
     def test1(self):
         self.Analyze("thisfile.c", """# include "c:\k.h"
@@ -48,7 +48,8 @@ def RunRule(lexer, contextStack):
                                                 "Do not use not reentrant function(%s)." % t.value)
 
 
-ruleManager.AddFunctionScopeRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddFunctionScopeRule(RunRule, ["ID"])
 
 ##########################################################################
 # Unit Test
@@ -57,7 +58,7 @@ ruleManager.AddFunctionScopeRule(RunRule)
 
 class testRule(nct):
     def setUpRule(self):
-        ruleManager.AddFunctionScopeRule(RunRule)
+        ruleManager.AddFunctionScopeRule(RunRule, ["ID"])
 
     def test1(self):
         self.Analyze("thisfile.c",
@@ -50,8 +50,9 @@ def RunFunctionScopeRule(lexer, fullName, decl, contextStack, context):
     depth = 0
 
 
-ruleManager.AddFunctionNameRule(RunFunctionScopeRule)
-ruleManager.AddFunctionScopeRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddFunctionNameRule(RunFunctionScopeRule)
+    ruleManager.AddFunctionScopeRule(RunRule, ["LBRACE", "RBRACE"])
 
 ##########################################################################
 # Unit Test
@@ -61,7 +62,7 @@ ruleManager.AddFunctionScopeRule(RunRule)
 class testRule(nct):
     def setUpRule(self):
         ruleManager.AddFunctionNameRule(RunFunctionScopeRule)
-        ruleManager.AddFunctionScopeRule(RunRule)
+        ruleManager.AddFunctionScopeRule(RunRule, ["LBRACE", "RBRACE"])
 
     def test1(self):
         self.Analyze("thisfile.c",
@@ -55,7 +55,8 @@ def RunRuleForType(lexer, currentType, fullName, decl, contextStack,
                         "The namespace brace should be on same line")
 
 
-ruleManager.AddTypeNameRule(RunRuleForType)
+def RegisterRules(ruleManager):
+    ruleManager.AddTypeNameRule(RunRuleForType)
 
 ##########################################################################
 # Unit Test
@@ -58,7 +58,8 @@ def RunRule(lexer, contextStack):
                     "after closing brace" % t.value)
 
 
-ruleManager.AddRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddRule(RunRule, ["ELSE", "CATCH"], needs=NEEDS_TOKENS)
 
 ##########################################################################
 # Unit Test
@@ -67,7 +68,7 @@ ruleManager.AddRule(RunRule)
 
 class testRule(nct):
     def setUpRule(self):
-        ruleManager.AddRule(RunRule)
+        ruleManager.AddRule(RunRule, ["ELSE", "CATCH"], needs=NEEDS_TOKENS)
 
     def test1(self):
         self.Analyze("thisfile.cpp", """
@@ -239,8 +239,9 @@ def RunRule(lexer, contextStack):
                     "No space allowed after = in initializer list")
 
 
-ruleManager.AddRule(RunRule)
-ruleManager.AddPreprocessRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddRule(RunRule, ["LBRACE", "RBRACE", "COMMA", "EQUALS"])
+    ruleManager.AddPreprocessRule(RunRule, ["LBRACE", "RBRACE", "COMMA", "EQUALS"])
 
 
 ##########################################################################
@@ -250,8 +251,8 @@ ruleManager.AddPreprocessRule(RunRule)
 
 class testRule(nct):
     def setUpRule(self):
-        ruleManager.AddRule(RunRule)
-        ruleManager.AddPreprocessRule(RunRule)
+        ruleManager.AddRule(RunRule, ["LBRACE", "RBRACE", "COMMA", "EQUALS"])
+        ruleManager.AddPreprocessRule(RunRule, ["LBRACE", "RBRACE", "COMMA", "EQUALS"])
 
     def test1(self):
         """Test correct designated initializer formatting."""
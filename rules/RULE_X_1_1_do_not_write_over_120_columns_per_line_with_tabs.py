@@ -21,7 +21,8 @@ def RunRule(lexer, line, lineno) :
         if len(line) > 120 :
             nsiqcppstyle_reporter.Error(DummyToken(lexer.filename, line, lineno, 0), __name__, 'Lines should very rarely be longer than 120 characters')
 
-ruleManager.AddLineRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddLineRule(RunRule, needs=NEEDS_TOKENS)
 
 
 
@@ -32,4 +33,4 @@ ruleManager.AddLineRule(RunRule)
 from nsiqunittest.nsiqcppstyle_unittestbase import *
 class testRule(nct):
     def setUpRule(self):
-        ruleManager.AddLineRule(RunRule)
+        ruleManager.AddLineRule(RunRule, needs=NEEDS_TOKENS)
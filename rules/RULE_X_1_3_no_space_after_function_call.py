@@ -25,7 +25,8 @@ def RunRule(lexer, contextStack):
             if t2.type != None and t2.type == "SPACE" :
                 nsiqcppstyle_reporter.Error(t, __name__, "no space after function call allowed '%s'" % t.value)
 
-ruleManager.AddRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddRule(RunRule, ["ID"])
 
 
 ###########################################################################################
@@ -34,5 +35,5 @@ ruleManager.AddRule(RunRule)
 from nsiqunittest.nsiqcppstyle_unittestbase import *
 class testRule(nct):
     def setUpRule(self):
-        ruleManager.AddRule(RunRule)
+        ruleManager.AddRule(RunRule, ["ID"])
                 
\ No newline at end of file
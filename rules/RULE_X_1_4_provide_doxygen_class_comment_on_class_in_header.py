@@ -45,7 +45,8 @@ def RunRule(lexer, currentType, fullName, decl, contextStack, typeContext) :
                 if t3 == None or t2.lexpos > t3.lexpos :
                     return 
             nsiqcppstyle_reporter.Error(t, __name__, "Doxygen Comment should be provided in front of class def(%s) in header." % fullName)
-ruleManager.AddTypeNameRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddTypeNameRule(RunRule)
 
 
 
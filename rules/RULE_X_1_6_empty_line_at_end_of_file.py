@@ -23,8 +23,9 @@ def RunRule(lexer, contextStack):
     return
 
 
-ruleManager.AddRule(RunRule)
-ruleManager.AddPreprocessRule(RunRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddRule(RunRule, needs=NEEDS_TOKENS)
+    ruleManager.AddPreprocessRule(RunRule, needs=NEEDS_TOKENS)
 
 
 ##########################################################################
@@ -34,8 +35,8 @@ ruleManager.AddPreprocessRule(RunRule)
 
 class testRule(nct):
     def setUpRule(self):
-        ruleManager.AddRule(RunRule)
-        ruleManager.AddPreprocessRule(RunRule)
+        ruleManager.AddRule(RunRule, needs=NEEDS_TOKENS)
+        ruleManager.AddPreprocessRule(RunRule, needs=NEEDS_TOKENS)
 
     def test1(self):
         self.Analyze("test/thisFile.c",
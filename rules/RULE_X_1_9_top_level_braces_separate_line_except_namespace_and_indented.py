@@ -79,8 +79,9 @@ def RunRuleForType(lexer, currentType, fullName, decl, contextStack,
                             "The brace should be located in start of line")
 
 
-ruleManager.AddFunctionNameRule(RunRuleForFunction)
-ruleManager.AddTypeNameRule(RunRuleForType)
+def RegisterRules(ruleManager):
+    ruleManager.AddFunctionNameRule(RunRuleForFunction)
+    ruleManager.AddTypeNameRule(RunRuleForType)
 
 ##########################################################################
 # Unit Test
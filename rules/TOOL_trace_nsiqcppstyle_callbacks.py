@@ -77,16 +77,17 @@ def SessionStartRule():
 def SessionEndRule():
     print("SessionEnd    ()")
 
-ruleManager.AddFunctionScopeRule(FunctionScopeRule)
-ruleManager.AddFunctionNameRule(FunctionNameRule)
-ruleManager.AddPreprocessRule(PreprocessRule)
-ruleManager.AddCommentRule(CommentRule)
-ruleManager.AddLineRule(LineRule)
-ruleManager.AddRule(TokenRule)
-ruleManager.AddFileStartRule(FileStartRule)
-ruleManager.AddFileEndRule(FileEndRule)
-ruleManager.AddProjectRules(ProjectRule)
-ruleManager.AddTypeNameRule(TypeNameRule)
-ruleManager.AddTypeScopeRule(TypeScopeRule)
-ruleManager.AddSessionStartRule(SessionStartRule)
-ruleManager.AddSessionEndRule(SessionEndRule)
+def RegisterRules(ruleManager):
+    ruleManager.AddFunctionScopeRule(FunctionScopeRule)
+    ruleManager.AddFunctionNameRule(FunctionNameRule)
+    ruleManager.AddPreprocessRule(PreprocessRule)
+    ruleManager.AddCommentRule(CommentRule)
+    ruleManager.AddLineRule(LineRule)
+    ruleManager.AddRule(TokenRule)
+    ruleManager.AddFileStartRule(FileStartRule)
+    ruleManager.AddFileEndRule(FileEndRule)
+    ruleManager.AddProjectRules(ProjectRule)
+    ruleManager.AddTypeNameRule(TypeNameRule)
+    ruleManager.AddTypeScopeRule(TypeScopeRule)
+    ruleManager.AddSessionStartRule(SessionStartRule)
+    ruleManager.AddSessionEndRule(SessionEndRule)